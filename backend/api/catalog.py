@@ -0,0 +1,99 @@
+import gzip
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from constants import CATALOG_CACHE_TIMEOUT, CATALOG_VERSION_TTL
+from recipes.cache import cache_is_shared
+
+CATALOG_VERSION_KEY = 'catalog_version'
+CONTENT_TYPE = 'application/json'
+
+
+def get_catalog_version():
+    """Версия справочников тегов и продуктов.
+
+    Сброс версии в кеше процесса другие процессы не видят: там версия
+    живет не дольше CATALOG_VERSION_TTL, после чего справочники
+    перечитываются из базы.
+    """
+    # Начальное значение от времени: после вытеснения ключа из кеша
+    # версия не повторит уже выданную.
+    cache.add(
+        CATALOG_VERSION_KEY, int(time.time() * 1000),
+        None if cache_is_shared() else CATALOG_VERSION_TTL
+    )
+    return cache.get(CATALOG_VERSION_KEY)
+
+
+def increment_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+
+
+def bump_catalog_version(**kwargs):
+    """Сброс закешированных справочников при любой записи в них.
+
+    Версия меняется после фиксации транзакции: до нее параллельный запрос
+    закешировал бы старые строки под новой версией, а при откате версию
+    менять незачем.
+    """
+    transaction.on_commit(increment_catalog_version)
+
+
+class CatalogCacheMixin:
+    """Кеширование выдачи справочника и условные GET-запросы.
+
+    Тело ответа хранится в кеше готовым JSON и сжатым gzip по ключу из
+    версии справочников и параметров запроса. Совпавший If-None-Match
+    получает 304 без обращения к базе. Данные выдачи строит
+    render_catalog.
+    """
+
+    # Справочники не зависят от пользователя: токен не проверяем.
+    authentication_classes = ()
+
+    def render_catalog(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+    def list(self, request, *args, **kwargs):
+        key = 'catalog:{}:{}:{}'.format(
+            self.basename,
+            get_catalog_version(),
+            urlencode(sorted(request.query_params.items()))
+        )
+        entry = cache.get(key)
+        if entry is None:
+            body = JSONRenderer().render(
+                self.render_catalog(request, *args, **kwargs)
+            )
+            entry = (
+                hashlib.sha1(body).hexdigest(), body, gzip.compress(body)
+            )
+            cache.set(key, entry, CATALOG_CACHE_TIMEOUT)
+        return self.catalog_response(request, *entry)
+
+    def catalog_response(self, request, digest, body, compressed):
+        etag, gzip_etag = f'"{digest}"', f'"{digest}-gzip"'
+        if_none_match = request.headers.get('If-None-Match', '')
+        use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+        if etag in if_none_match or gzip_etag in if_none_match:
+            response = HttpResponseNotModified()
+        elif use_gzip:
+            response = HttpResponse(compressed, content_type=CONTENT_TYPE)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(body, content_type=CONTENT_TYPE)
+        response['ETag'] = gzip_etag if use_gzip else etag
+        # Ответ можно хранить, но перед использованием надо свериться.
+        response['Cache-Control'] = 'no-cache'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
@@ -1,27 +1,20 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import (
     BooleanFilter, CharFilter, FilterSet, ModelMultipleChoiceFilter
 )
 
-from recipes.models import Ingredient, Recipe, Tag
-
-
-class IngredientFilter(FilterSet):
-    """Фильтрация продуктов."""
-
-    name = CharFilter(field_name='name', lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ['name', ]
+from recipes.models import Recipe, Tag
 
 
 class RecipeFilter(FilterSet):
     """Фильтр рецептов."""
 
+    search = CharFilter(method='filter_search')
     tags = ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags'
     )
     is_favorited = BooleanFilter(
         field_name='favorites__user',
@@ -32,6 +25,20 @@ class RecipeFilter(FilterSet):
         method='filter_is_in_shopping_cart'
     )
 
+    def filter_search(self, recipes, name, value):
+        # Сначала лучшие совпадения, при равенстве - свежие.
+        return recipes.search(value).order_by('-search_rank', '-pub_date')
+
+    def filter_tags(self, recipes, name, tags):
+        # Без тегов метод получает пустую выборку тегов, а не None.
+        if not tags:
+            return recipes
+        # EXISTS вместо соединения с DISTINCT: рецепты читаются по индексу
+        # даты публикации до заполнения страницы.
+        return recipes.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=tags
+        )))
+
     def filter_is_favorited(self, recipes, name, value):
         if value and self.request.user.is_authenticated:
             return recipes.filter(favorites__user=self.request.user)
@@ -44,4 +51,6 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'search'
+        ]
@@ -0,0 +1,74 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from api.catalog import get_catalog_version
+from constants import INGREDIENT_INDEX_TTL
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс продуктов в памяти процесса для поиска по началу названия.
+
+    Хранит отсортированные названия в нижнем регистре и готовые к выдаче
+    словари продуктов. Строится при первом обращении и перестраивается
+    при смене версии справочников. Если кеш не общий для процессов,
+    изменения из других процессов подхватываются не позже чем через
+    INGREDIENT_INDEX_TTL.
+    """
+
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        self.ttl = ttl
+        self.lock = Lock()
+        self.index = None
+        self.version = None
+        self.built_at = 0.0
+
+    def is_stale(self, index):
+        return (
+            index is None
+            or self.version != get_catalog_version()
+            or time.monotonic() - self.built_at > self.ttl
+        )
+
+    def build(self):
+        version = get_catalog_version()
+        rows = sorted(
+            (name.casefold(), pk, name, unit)
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, pk, name, unit in rows
+        ]
+        # Ключи и продукты подменяются одним присваиванием: поиск в других
+        # потоках всегда видит согласованную пару.
+        self.index = ([row[0] for row in rows], items)
+        self.version = version
+        self.built_at = time.monotonic()
+        return self.index
+
+    def get_index(self):
+        index = self.index
+        if self.is_stale(index):
+            with self.lock:
+                index = self.index
+                if self.is_stale(index):
+                    index = self.build()
+        return index
+
+    def search(self, prefix='', limit=None):
+        """Продукты, название которых начинается с prefix."""
+        keys, items = self.get_index()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = start
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return items[start:end]
+
+
+ingredient_index = IngredientIndex()
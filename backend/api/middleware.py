@@ -0,0 +1,138 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Списки параметров разной длины (IN (%s, %s, ...)) считаем одним запросом.
+PARAMS_LIST_PATTERN = re.compile(r'%s(?:,\s*%s)*')
+# Точки сохранения вложенных transaction.atomic (и всех atomic в тестах,
+# идущих внутри транзакции) - управление транзакцией, а не запросы.
+SAVEPOINT_PATTERN = re.compile(
+    r'(?:RELEASE |ROLLBACK TO )?SAVEPOINT ', re.IGNORECASE
+)
+
+
+def fingerprint(sql):
+    """Отпечаток запроса без учета количества параметров."""
+    return PARAMS_LIST_PATTERN.sub('?', sql)
+
+
+def get_query_budget(request):
+    """Бюджет запросов к базе, объявленный на вьюсете (query_budgets)."""
+    match = request.resolver_match
+    view = match and match.func
+    actions = getattr(view, 'actions', None)
+    if not actions:
+        return None
+    budgets = getattr(view.cls, 'query_budgets', {})
+    return budgets.get(actions.get(request.method.lower()))
+
+
+class QueryStats:
+    """Обертка выполнения запросов: счетчик, время и повторы."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if SAVEPOINT_PATTERN.match(sql):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        return sum(
+            count - 1 for count in self.fingerprints.values() if count > 1
+        )
+
+
+class QueryStatsMiddleware:
+    """Статистика запросов к базе в заголовках ответа и в логе.
+
+    Включается переменной окружения DB_QUERY_STATS=True.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        with self.collect(stats):
+            response = self.get_response(request)
+        response.query_stats = stats
+        budget = get_query_budget(request)
+        if budget is not None:
+            response['X-DB-Query-Budget'] = budget
+        if response.streaming:
+            # Тело потокового ответа формируется при отдаче, уже после
+            # заголовков: запросы считаются до последней части тела, а
+            # статистика попадает только в лог при закрытии ответа.
+            response.streaming_content = self.stream(
+                response.streaming_content, request, stats, budget
+            )
+            return response
+        duration_ms = stats.duration * 1000
+        response['Server-Timing'] = (
+            f'db;dur={duration_ms:.1f};desc="{stats.count} queries"'
+        )
+        response['X-DB-Queries'] = stats.count
+        response['X-DB-Duplicates'] = stats.duplicates
+        self.log(request, stats, budget)
+        return response
+
+    @staticmethod
+    def collect(stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        return stack
+
+    def stream(self, content, request, stats, budget):
+        try:
+            with self.collect(stats):
+                yield from content
+        finally:
+            # Генератор закрывается вместе с ответом (response.close()).
+            self.log(request, stats, budget)
+
+    def log(self, request, stats, budget):
+        log = (
+            logger.warning if budget is not None and stats.count > budget
+            else logger.info
+        )
+        log(
+            '%s %s: %s запросов (бюджет %s), повторов %s, %.1f мс',
+            request.method, request.path, stats.count, budget,
+            stats.duplicates, stats.duration * 1000
+        )
+
+
+def assert_query_budget(response):
+    """Проверка для тестов: ответ уложился в бюджет запросов вьюсета.
+
+    Тесту нужен QueryStatsMiddleware в MIDDLEWARE (override_settings).
+    Тело потокового ответа дочитывается: его запросы тоже в бюджете.
+    """
+    if 'X-DB-Query-Budget' not in response:
+        raise AssertionError('Для запроса не объявлен бюджет запросов.')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    queries = response.query_stats.count
+    budget = int(response['X-DB-Query-Budget'])
+    if queries > budget:
+        raise AssertionError(
+            f'Выполнено {queries} запросов к базе при бюджете {budget}.'
+        )
@@ -1,6 +1,148 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from constants import FEED_CACHE_TIMEOUT
 
 
 class Pagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class RecipePagination(Pagination):
+    """Постраничная выдача рецептов с режимом курсора.
+
+    С параметром cursor (пустым для первой страницы) выдача идет по ключу
+    (-pub_date, -id) без OFFSET и без подсчета общего числа рецептов.
+    Число считается только по запросу с параметром count. Результаты
+    поиска (search) упорядочены по совпадению, и курсор к ним не
+    применяется: они выдаются по страницам.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    search_query_param = 'search'
+    invalid_cursor_message = 'Неверный курсор.'
+    search_cursor_message = (
+        'Результаты поиска выдаются по страницам (page), а не по курсору.'
+    )
+    # Курсор без явного параметра cursor.
+    always_cursor = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = (
+            self.always_cursor
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        if (
+            not self.always_cursor
+            and self.search_query_param in request.query_params
+        ):
+            raise ValidationError({
+                self.cursor_query_param: self.search_cursor_message
+            })
+        self.request = request
+        self.count = (
+            queryset.count() if self.count_query_param in request.query_params
+            else None
+        )
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            pub_date, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        page_size = self.get_page_size(request)
+        # Лишний рецепт показывает, есть ли следующая страница.
+        recipes = list(queryset.order_by('-pub_date', '-pk')[:page_size + 1])
+        self.next_cursor = (
+            self.encode_cursor(recipes[page_size - 1])
+            if len(recipes) > page_size else None
+        )
+        return recipes[:page_size]
+
+    def decode_cursor(self, cursor):
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                cursor.encode()
+            ).decode().split('|')
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (DecodeError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, recipe):
+        return urlsafe_b64encode(
+            f'{recipe.pub_date.isoformat()}|{recipe.pk}'.encode()
+        ).decode()
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        response = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+
+def feed_cache_key(user_id):
+    return f'feed:{user_id}'
+
+
+def invalidate_feed(user_id):
+    cache.delete(feed_cache_key(user_id))
+
+
+class FeedPagination(RecipePagination):
+    """Лента подписок: всегда по курсору, первая страница - из кеша.
+
+    В кеше на FEED_CACHE_TIMEOUT лежат только id рецептов первой
+    страницы и курсор следующей: дорогое соединение с подписками и
+    сортировка не повторяются, а отметки и счетчики читаются свежими.
+    Кеш сбрасывается при изменении подписок пользователя.
+    """
+
+    always_cursor = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            request.query_params.get(self.cursor_query_param)
+            or self.count_query_param in request.query_params
+        ):
+            return super().paginate_queryset(queryset, request, view)
+        key = feed_cache_key(request.user.pk)
+        page_size = self.get_page_size(request)
+        entry = cache.get(key)
+        if entry is None or entry['page_size'] != page_size:
+            recipes = super().paginate_queryset(queryset, request, view)
+            cache.set(key, {
+                'page_size': page_size,
+                'ids': [recipe.pk for recipe in recipes],
+                'next': self.next_cursor,
+            }, FEED_CACHE_TIMEOUT)
+            return recipes
+        self.request, self.use_cursor, self.count = request, True, None
+        self.next_cursor = entry['next']
+        return list(queryset.filter(pk__in=entry['ids']).order_by(
+            '-pub_date', '-pk'
+        ))
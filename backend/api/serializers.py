@@ -1,14 +1,21 @@
+import json
 from collections import Counter
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.http import QueryDict
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from constants import MIN_COOKING_MINUTES, MIN_INGREDIENT_AMOUNT
+from api.uploads import ImageUploadField
+from constants import (
+    MAX_BULK_MARKS, MIN_COOKING_MINUTES, MIN_INGREDIENT_AMOUNT
+)
+from recipes.images import variant_urls
 from recipes.models import (
-    Favorite, Ingredient, IngredientInRecipe, Recipe, ShoppingCart, Subscribe,
-    Tag
+    CartProduct, Favorite, Ingredient, IngredientInRecipe, Recipe,
+    ShoppingCart, Subscribe, Tag
 )
 
 User = get_user_model()
@@ -18,14 +25,20 @@ class ExtendedUserSerializer(UserSerializer):
     """Доработанный сериализатор djoser для пользователей."""
 
     is_subscribed = serializers.SerializerMethodField()
-    avatar = Base64ImageField(required=False, allow_null=True)
+    avatar = ImageUploadField(required=False, allow_null=True)
 
     class Meta:
         model = User
-        fields = (*UserSerializer.Meta.fields, 'is_subscribed', 'avatar')
+        fields = (
+            *UserSerializer.Meta.fields, 'is_subscribed', 'avatar',
+            'recipes_count', 'followers_count', 'follows_count'
+        )
         read_only_fields = fields
 
     def get_is_subscribed(self, author):
+        # Выборки для API несут готовую отметку (with_subscription).
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
         return (
             self.context
             and self.context.get('request').user.is_authenticated
@@ -40,22 +53,20 @@ class SubscribeUserSerializer(ExtendedUserSerializer):
     """Сериализатор для подписки."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(source='recipes.count')
 
     class Meta:
         model = User
-        fields = (
-            *ExtendedUserSerializer.Meta.fields, 'recipes', 'recipes_count'
-        )
+        fields = (*ExtendedUserSerializer.Meta.fields, 'recipes')
         read_only_fields = fields
 
     def get_recipes(self, author):
+        # Выборка подписок несет заранее подгруженные рецепты.
+        if hasattr(author, 'recipes_preview'):
+            recipes = author.recipes_preview
+        else:
+            recipes = author.recipes.all()[:self.context.get('recipes_limit')]
         return ShortRecipeSerializer(
-            author.recipes.all()[:int(
-                self.context.get('request').GET.get('recipes_limit', 10**10)
-            )],
-            many=True,
-            context=self.context
+            recipes, many=True, context=self.context
         ).data
 
 
@@ -106,15 +117,42 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ImageVariantsMixin(serializers.Serializer):
+    """Адреса уменьшенных копий картинки рецепта."""
+
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, recipe):
+        request = self.context.get('request')
+        return variant_urls(
+            recipe,
+            request.build_absolute_uri if request else lambda url: url
+        )
+
+
+class ShortRecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     """Сериализатор для сокращенного отображения рецептов."""
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
         read_only_fields = fields
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для отметок пачкой."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_MARKS
+    )
+
+    def validate_recipes(self, recipes):
+        # Повторы не мешают, но отвечаем по каждому id один раз.
+        return list(dict.fromkeys(recipes))
+
+
 class BaseRecipeSerializer(serializers.ModelSerializer):
     """Базовый сериализатор рецептов."""
 
@@ -128,7 +166,7 @@ class BaseRecipeSerializer(serializers.ModelSerializer):
         ]
 
 
-class GetRecipeSerializer(BaseRecipeSerializer):
+class GetRecipeSerializer(ImageVariantsMixin, BaseRecipeSerializer):
     """Сериализатор для полного отображения рецептов."""
 
     tags = TagSerializer(many=True)
@@ -141,11 +179,15 @@ class GetRecipeSerializer(BaseRecipeSerializer):
     class Meta(BaseRecipeSerializer.Meta):
         fields = [
             *BaseRecipeSerializer.Meta.fields,
-            'ingredients', 'is_favorited', 'is_in_shopping_cart'
+            'ingredients', 'is_favorited', 'is_in_shopping_cart',
+            'favorites_count', 'shopping_carts_count', 'image_variants'
         ]
         read_only_fields = fields
 
-    def get_mark(self, recipe, model):
+    def get_mark(self, recipe, model, name):
+        # Вьюсеты передают отметки пользователя из кеша (MarkSets).
+        if 'marks' in self.context:
+            return self.context['marks'].has(name, recipe.pk)
         request = self.context.get('request')
         return (
             request
@@ -156,10 +198,10 @@ class GetRecipeSerializer(BaseRecipeSerializer):
         )
 
     def get_is_favorited(self, recipe):
-        return self.get_mark(recipe, Favorite)
+        return self.get_mark(recipe, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, recipe):
-        return self.get_mark(recipe, ShoppingCart)
+        return self.get_mark(recipe, ShoppingCart, 'is_in_shopping_cart')
 
 
 class WriteRecipeSerializer(BaseRecipeSerializer):
@@ -168,12 +210,27 @@ class WriteRecipeSerializer(BaseRecipeSerializer):
     ingredients = WriteIngredientInRecipeSerializer(
         many=True, source='ingredients_in_recipe'
     )
-    image = Base64ImageField()
+    image = ImageUploadField()
     cooking_time = serializers.IntegerField(min_value=MIN_COOKING_MINUTES)
 
     class Meta(BaseRecipeSerializer.Meta):
         fields = [*BaseRecipeSerializer.Meta.fields, 'ingredients']
 
+    def to_internal_value(self, data):
+        # В multipart-запросе с файлом картинки списки продуктов и тегов
+        # передаются строками JSON.
+        if isinstance(data, QueryDict):
+            data = data.dict()
+            for name in ('ingredients', 'tags'):
+                if isinstance(data.get(name), str):
+                    try:
+                        data[name] = json.loads(data[name])
+                    except ValueError:
+                        raise serializers.ValidationError(
+                            {name: ['Ожидается список в формате JSON.']}
+                        )
+        return super().to_internal_value(data)
+
     def check_data(self, data, name):
         if not data:
             raise serializers.ValidationError(
@@ -216,6 +273,35 @@ class WriteRecipeSerializer(BaseRecipeSerializer):
             ) for ingredient in ingredients
         )
 
+    def update_ingredients(self, recipe, ingredients):
+        """Записываем только разницу с продуктами рецепта в базе.
+
+        Возвращает словарь {id продукта: количество} до изменения.
+        """
+        lines = recipe.ingredients_in_recipe
+        old_amounts = dict(lines.values_list('ingredient_id', 'amount'))
+        new_amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            lines.filter(ingredient_id__in=removed).delete()
+        self.fill_ingredients(recipe, [
+            ingredient for ingredient in ingredients
+            if ingredient['id'].pk not in old_amounts
+        ])
+        changed = {
+            pk: amount for pk, amount in new_amounts.items()
+            if pk in old_amounts and old_amounts[pk] != amount
+        }
+        if changed:
+            lines.filter(ingredient_id__in=changed).update(amount=Case(
+                *(When(ingredient_id=pk, then=Value(amount))
+                  for pk, amount in changed.items())
+            ))
+        return old_amounts
+
     def create(self, validated_data):
         # Создаем рецепт.
         ingredients = validated_data.pop('ingredients_in_recipe')
@@ -226,6 +312,7 @@ class WriteRecipeSerializer(BaseRecipeSerializer):
         recipe.tags.set(tags)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         # После удаления проверки 'ingredients_in_recipe' в def validate
         # запрос patch на обновление рецепта без ингредиентов дает ошибку 500.
@@ -236,13 +323,16 @@ class WriteRecipeSerializer(BaseRecipeSerializer):
             )
         ingredients = validated_data.pop('ingredients_in_recipe')
         tags = validated_data.pop('tags')
-        # Устанавливаем новые теги и перезаписываем продукты.
+        # Устанавливаем новые теги и обновляем продукты.
         instance.tags.set(tags)
-        instance.ingredients_in_recipe.all().delete()
-        self.fill_ingredients(recipe=instance, ingredients=ingredients)
+        old_amounts = self.update_ingredients(instance, ingredients)
+        # Корзины с рецептом получают разницу по продуктам.
+        CartProduct.objects.update_for_recipe(instance, old_amounts)
         return super().update(
             instance=instance, validated_data=validated_data
         )
 
     def to_representation(self, instance):
-        return GetRecipeSerializer(instance).to_representation(instance)
+        return GetRecipeSerializer(
+            instance, context=self.context
+        ).to_representation(instance)
@@ -1,30 +1,26 @@
-import locale
-from datetime import datetime
+from datetime import date
 
-from constants import header_layout, products_layout, recipes_layout
+from constants import MONTHS, header_layout, products_layout, recipes_layout
 
 
 def shopping_list_render(recipes, products):
-    """Получает сеты рецептов и продуктов и возвращает список покупок."""
+    """Получает сеты рецептов и продуктов и построчно отдает список покупок.
 
-    locale.setlocale(locale.LC_ALL, 'ru_RU.utf8')
-
-    return '\n'.join([
-        header_layout.format(datetime.now().date().strftime("%d %B %Y")),
-        'ПРОДУКТЫ:',
-        *[
-            products_layout.format(
-                number,
-                position["product"].capitalize(),
-                position["unit"],
-                position["amount"]
-            ) for number, position in enumerate(products, start=1)
-        ],
-        'ДЛЯ РЕЦЕПТОВ:',
-        *[
-            recipes_layout.format(
-                recipe.name,
-                recipe.author.username
-            ) for recipe in recipes
-        ],
-    ])
+    Дата форматируется без смены локали: setlocale меняет состояние всего
+    процесса и небезопасен в многопоточном воркере.
+    """
+    today = date.today()
+    yield header_layout.format(
+        f'{today.day:02d} {MONTHS[today.month - 1]} {today.year}'
+    ) + '\n'
+    yield 'ПРОДУКТЫ:\n'
+    for number, position in enumerate(products, start=1):
+        yield products_layout.format(
+            number,
+            position["product"].capitalize(),
+            position["unit"],
+            position["amount"]
+        ) + '\n'
+    yield 'ДЛЯ РЕЦЕПТОВ:\n'
+    for recipe in recipes:
+        yield recipes_layout.format(recipe.name, recipe.author.username) + '\n'
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+
+from api.catalog import bump_catalog_version
+from api.pagination import invalidate_feed
+from recipes.models import Ingredient, Subscribe, Tag
+
+for model in (Tag, Ingredient):
+    post_save.connect(
+        bump_catalog_version, sender=model,
+        dispatch_uid=f'catalog_version_save_{model.__name__}'
+    )
+    post_delete.connect(
+        bump_catalog_version, sender=model,
+        dispatch_uid=f'catalog_version_delete_{model.__name__}'
+    )
+
+
+def subscriptions_changed(sender, instance, **kwargs):
+    # Лента подписчика собрана по старому списку авторов.
+    invalidate_feed(instance.user_id)
+
+
+post_save.connect(
+    subscriptions_changed, sender=Subscribe, dispatch_uid='feed_subscribe'
+)
+post_delete.connect(
+    subscriptions_changed, sender=Subscribe, dispatch_uid='feed_unsubscribe'
+)
@@ -0,0 +1,660 @@
+import gzip
+import struct
+import sys
+import tempfile
+import zlib
+from datetime import timedelta
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.catalog import CATALOG_VERSION_KEY, get_catalog_version
+from api.ingredients import ingredient_index
+from api.middleware import assert_query_budget
+from api.pagination import feed_cache_key
+from api.service import shopping_list_render
+from api.serializers import WriteRecipeSerializer
+from api.views import RecipeViewSet
+from constants import CATALOG_VERSION_TTL, MAX_BULK_MARKS
+from recipes.marks import mark_sets_key
+from recipes.models import (
+    Favorite, Ingredient, IngredientInRecipe, Recipe, ShoppingCart, Subscribe,
+    Tag, User
+)
+
+RECIPES_URL = '/api/recipes/'
+AVATAR_URL = '/api/users/me/avatar/'
+QUERY_STATS_MIDDLEWARE = 'api.middleware.QueryStatsMiddleware'
+
+
+def png_chunk(kind, data):
+    return (
+        struct.pack('>I', len(data)) + kind + data
+        + struct.pack('>I', zlib.crc32(kind + data))
+    )
+
+
+def solid_png(width, height, rows=None):
+    """PNG одного цвета, собранный по строкам без картинки в памяти.
+
+    rows - сколько строк точек записать; заголовок с размерами без
+    точек (rows=0) Pillow открывает так же, как целую картинку.
+    """
+    compressor = zlib.compressobj()
+    row = bytes(1 + width * 3)
+    data = b''.join(
+        compressor.compress(row)
+        for _ in range(height if rows is None else rows)
+    ) + compressor.flush()
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0,
+                                       0, 0)),
+        png_chunk(b'IDAT', data),
+        png_chunk(b'IEND', b''),
+    ))
+
+
+def peak_rss_kb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def create_user(number):
+    return User.objects.create_user(
+        email=f'user{number}@example.com', username=f'user{number}',
+        first_name='Имя', last_name='Фамилия', password='password'
+    )
+
+
+def create_recipes(author, count, tags=(), ingredients=()):
+    """Рецепты с тегами и продуктами; картинки в хранилище не пишутся."""
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author, name=f'Рецепт {number}', text='Описание',
+            image=f'recipe_images/{number}.png', cooking_time=10
+        )
+        recipe.tags.set(tags)
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+class APITestCase(TestCase):
+    """Автор с рецептами, читатель и клиенты API."""
+
+    recipes_count = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(1)
+        cls.reader = create_user(2)
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'продукт {number}', measurement_unit='г'
+            ) for number in range(3)
+        ]
+        cls.recipes = create_recipes(
+            cls.author, cls.recipes_count, cls.tags, cls.ingredients
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.guest = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def favorited(self):
+        return {
+            recipe['id']: recipe['is_favorited']
+            for recipe in self.client.get(RECIPES_URL).json()['results']
+        }
+
+
+class MarkSetsTest(APITestCase):
+    """Флаги отметок в выдаче после записи в другом процессе."""
+
+    def favorite_then_list(self, commit):
+        recipe = self.recipes[0]
+        self.assertFalse(self.favorited()[recipe.id])
+        with self.captureOnCommitCallbacks(execute=commit):
+            response = self.client.post(
+                f'{RECIPES_URL}{recipe.id}/favorite/'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(self.favorited()[recipe.id])
+
+    def test_process_local_cache_is_not_used(self):
+        # Колбэки on_commit не выполняются: сброс ключа не доходит до
+        # кеша, как не дошел бы до кеша другого воркера.
+        self.favorite_then_list(commit=False)
+        self.assertIsNone(cache.get(mark_sets_key(self.reader.pk)))
+
+    def test_shared_cache_is_invalidated(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': location,
+            }}):
+                self.favorited()
+                self.assertIsNotNone(cache.get(mark_sets_key(self.reader.pk)))
+                self.favorite_then_list(commit=True)
+
+    def test_large_recipe_id(self):
+        recipe = Recipe.objects.create(
+            id=2 ** 40, author=self.author, name='Рецепт', text='Описание',
+            image='recipe_images/large.png', cooking_time=10
+        )
+        Favorite.objects.create(user=self.reader, recipe=recipe)
+        flags = self.favorited()
+        self.assertTrue(flags[recipe.id])
+        self.assertFalse(flags[self.recipes[0].id])
+
+
+class MarkedRecipesTestCase(APITestCase):
+    """Рецепты двух авторов, подписка и отметки читателя."""
+
+    recipes_count = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = create_user(3)
+        create_recipes(other, 3, cls.tags, cls.ingredients)
+        Subscribe.objects.create(user=cls.reader, subscribed=cls.author)
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.recipes[1])
+
+
+class RecipeReadQueriesTest(MarkedRecipesTestCase):
+    """Число запросов чтения рецептов не зависит от числа рецептов."""
+
+    def test_list(self):
+        # Подсчет, рецепты, авторы, теги, продукты; с токеном - еще
+        # токен и отметки.
+        for client, queries in ((self.guest, 5), (self.client, 7)):
+            for limit in (2, 10):
+                with self.subTest(limit=limit, queries=queries):
+                    with self.assertNumQueries(queries):
+                        response = client.get(f'{RECIPES_URL}?limit={limit}')
+                    self.assertEqual(len(response.json()['results']), limit)
+
+    def test_retrieve(self):
+        recipe = self.recipes[0]
+        for client, queries, flag in (
+            (self.guest, 4, False), (self.client, 6, True)
+        ):
+            with self.subTest(queries=queries):
+                with self.assertNumQueries(queries):
+                    data = client.get(f'{RECIPES_URL}{recipe.id}/').json()
+                self.assertEqual(data['is_favorited'], flag)
+                self.assertEqual(data['author']['is_subscribed'], flag)
+                self.assertEqual(
+                    len(data['ingredients']), len(self.ingredients)
+                )
+
+
+class RecipeSearchTest(APITestCase):
+    """Поиск рецептов по названию и описанию."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Индекс поиска заполняют сигналы сохранения рецептов.
+        cls.soup = Recipe.objects.create(
+            author=cls.author, name='Суп', text='Щавель и яйцо',
+            image='recipe_images/soup.png', cooking_time=30
+        )
+        cls.salad = Recipe.objects.create(
+            author=cls.author, name='Щавель с огурцом', text='Салат',
+            image='recipe_images/salad.png', cooking_time=5
+        )
+
+    def test_ranked_by_relevance(self):
+        response = self.guest.get(f'{RECIPES_URL}?search=щавель')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.salad.id, self.soup.id]
+        )
+
+    def test_cursor_is_rejected(self):
+        response = self.guest.get(f'{RECIPES_URL}?search=щавель&cursor=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+
+
+class RecipeCursorTest(APITestCase):
+    """Выдача рецептов по курсору (-pub_date, -id)."""
+
+    recipes_count = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Рецепты с одинаковой датой: порядок между ними задает id.
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in cls.recipes[1:5]]
+        ).update(pub_date=cls.recipes[0].pub_date)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            data = self.guest.get(url).json()
+            self.assertNotIn('count', data)
+            ids += [recipe['id'] for recipe in data['results']]
+            url = data['next']
+        return ids
+
+    def test_walk_without_duplicates_or_gaps(self):
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-pk'
+        ).values_list('pk', flat=True))
+        for limit in (1, 2, 3, len(expected), len(expected) + 1):
+            with self.subTest(limit=limit):
+                self.assertEqual(
+                    self.walk(f'{RECIPES_URL}?cursor=&limit={limit}'),
+                    expected
+                )
+
+    def test_count(self):
+        data = self.guest.get(f'{RECIPES_URL}?cursor=&count=1&limit=2').json()
+        self.assertEqual(data['count'], self.recipes_count)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIn('cursor=', data['next'])
+
+    def test_malformed_cursor(self):
+        for cursor in ('!!!', 'bm90LWEtY3Vyc29y', 'YXxi', 'MjAyMC0wMS0wMXx4'):
+            with self.subTest(cursor=cursor):
+                response = self.guest.get(f'{RECIPES_URL}?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+
+    def test_search_with_cursor(self):
+        next_link = self.guest.get(f'{RECIPES_URL}?cursor=&limit=2').json()
+        response = self.guest.get(f'{next_link["next"]}&search=рецепт')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+
+
+class FeedTest(APITestCase):
+    """Лента рецептов авторов из подписок."""
+
+    url = f'{RECIPES_URL}feed/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = create_user(3)
+        cls.stranger = create_user(4)
+        other_recipes = create_recipes(cls.other, 3)
+        create_recipes(cls.stranger, 2)
+        # Рецепты двух авторов вперемешку по дате.
+        start = cls.recipes[0].pub_date
+        for number, recipe in enumerate(
+            [*cls.recipes, *other_recipes][::-1]
+        ):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=start + timedelta(minutes=number % 4)
+            )
+        for author in (cls.author, cls.other):
+            Subscribe.objects.create(user=cls.reader, subscribed=author)
+
+    def expected(self, *authors):
+        return list(Recipe.objects.filter(author__in=authors).order_by(
+            '-pub_date', '-pk'
+        ).values_list('pk', flat=True))
+
+    def feed(self, url=None):
+        data = self.client.get(url or self.url).json()
+        return [recipe['id'] for recipe in data['results']], data['next']
+
+    def test_anonymous(self):
+        self.assertEqual(self.guest.get(self.url).status_code, 401)
+
+    def test_order_across_authors(self):
+        ids, next_link = self.feed()
+        self.assertEqual(ids, self.expected(self.author, self.other))
+        self.assertIsNone(next_link)
+
+    def test_cursor_continuation(self):
+        ids, next_link = self.feed(f'{self.url}?limit=2')
+        self.assertEqual(len(ids), 2)
+        while next_link:
+            page, next_link = self.feed(next_link)
+            ids += page
+        self.assertEqual(ids, self.expected(self.author, self.other))
+
+    def test_first_page_cache_is_invalidated(self):
+        key = feed_cache_key(self.reader.pk)
+        url = f'{self.url}?limit=10'
+        self.feed(url)
+        self.assertIsNotNone(cache.get(key))
+        with self.assertNumQueries(6):
+            # Первая страница из кеша: токен, рецепты по id, авторы,
+            # теги, продукты и отметки.
+            self.feed(url)
+        response = self.client.post(
+            f'/api/users/{self.stranger.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(
+            self.feed(url)[0],
+            self.expected(self.author, self.other, self.stranger)
+        )
+        response = self.client.delete(f'/api/users/{self.other.id}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(
+            self.feed(url)[0], self.expected(self.author, self.stranger)
+        )
+
+
+class BulkMarksTest(APITestCase):
+    """Отметки на список рецептов."""
+
+    url = f'{RECIPES_URL}shopping_cart/'
+
+    def test_add_and_remove(self):
+        ids = [recipe.id for recipe in self.recipes]
+        response = self.client.post(
+            self.url, {'recipes': ids}, format='json'
+        )
+        self.assertEqual(
+            {item['status'] for item in response.json()['results']},
+            {'added'}
+        )
+        self.assertEqual(
+            set(self.reader.cart_products.values_list('amount', flat=True)),
+            {len(ids)}
+        )
+        missing = max(ids) + 1
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(
+                self.url, {'recipes': [ids[0], ids[1], missing]},
+                format='json'
+            )
+        self.assertEqual(response.json()['results'], [
+            {'id': ids[0], 'status': 'removed'},
+            {'id': ids[1], 'status': 'removed'},
+            {'id': missing, 'status': 'not_found'},
+        ])
+        deletes = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('DELETE FROM "recipes_shoppingcart"')
+        ]
+        self.assertEqual(len(deletes), 1)
+        self.assertEqual(
+            list(ShoppingCart.objects.filter(
+                user=self.reader
+            ).values_list('recipe_id', flat=True)),
+            [ids[2]]
+        )
+        counts = dict(Recipe.objects.filter(pk__in=ids).values_list(
+            'pk', 'shopping_carts_count'
+        ))
+        self.assertEqual(counts, {ids[0]: 0, ids[1]: 0, ids[2]: 1})
+        self.assertEqual(
+            set(self.reader.cart_products.values_list('amount', flat=True)),
+            {1}
+        )
+
+    def test_too_many_ids(self):
+        ids = list(range(1, MAX_BULK_MARKS + 2))
+        for method in ('post', 'delete'):
+            with self.subTest(method=method):
+                response = getattr(self.client, method)(
+                    self.url, {'recipes': ids}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes', response.json())
+
+    def test_delete_is_chunked(self):
+        ids = [recipe.id for recipe in self.recipes]
+        ShoppingCart.objects.add_marks(self.reader, ids)
+        with mock.patch('recipes.models.MAX_BULK_MARKS', 2):
+            with CaptureQueriesContext(connection) as queries:
+                ShoppingCart.objects.delete_marks(self.reader, ids)
+        self.assertEqual(
+            sum(query['sql'].startswith('DELETE') for query in queries), 2
+        )
+        self.assertFalse(ShoppingCart.objects.filter(user=self.reader))
+
+
+class UpdateIngredientsTest(APITestCase):
+    """Запись при изменении продуктов рецепта - только разница."""
+
+    def test_only_difference_is_written(self):
+        recipe = self.recipes[0]
+        kept, changed, removed = self.ingredients
+        added = Ingredient.objects.create(name='соль', measurement_unit='г')
+        line_ids = dict(recipe.ingredients_in_recipe.values_list(
+            'ingredient_id', 'id'
+        ))
+        with CaptureQueriesContext(connection) as queries:
+            old_amounts = WriteRecipeSerializer().update_ingredients(
+                recipe, [
+                    {'id': kept, 'amount': 1},
+                    {'id': changed, 'amount': 5},
+                    {'id': added, 'amount': 2},
+                ]
+            )
+        statements = [
+            query['sql'].split(maxsplit=1)[0] for query in queries
+        ]
+        self.assertEqual(
+            sorted(statements), ['DELETE', 'INSERT', 'SELECT', 'UPDATE']
+        )
+        self.assertEqual(
+            old_amounts, {kept.pk: 1, changed.pk: 1, removed.pk: 1}
+        )
+        lines = {
+            line.ingredient_id: line
+            for line in recipe.ingredients_in_recipe.all()
+        }
+        self.assertEqual(set(lines), {kept.pk, changed.pk, added.pk})
+        self.assertEqual(lines[kept.pk].id, line_ids[kept.pk])
+        self.assertEqual(lines[changed.pk].id, line_ids[changed.pk])
+        self.assertEqual(lines[changed.pk].amount, 5)
+        self.assertEqual(lines[added.pk].amount, 2)
+
+
+@override_settings(MIDDLEWARE=[QUERY_STATS_MIDDLEWARE, *(
+    middleware for middleware in settings.MIDDLEWARE
+    if middleware != QUERY_STATS_MIDDLEWARE
+)])
+class QueryBudgetTest(MarkedRecipesTestCase):
+    """Запросы к API укладываются в бюджеты запросов вьюсетов."""
+
+    def assert_budgets(self, requests):
+        for client, method, url, status in requests:
+            with self.subTest(method=method, url=url):
+                response = getattr(client, method)(url)
+                self.assertEqual(response.status_code, status)
+                assert_query_budget(response)
+
+    def test_recipe_budgets(self):
+        recipe = self.recipes[2]
+        self.assert_budgets((
+            (self.guest, 'get', RECIPES_URL, 200),
+            (self.client, 'get', RECIPES_URL, 200),
+            (self.client, 'get', f'{RECIPES_URL}{recipe.id}/', 200),
+            (self.client, 'get', f'{RECIPES_URL}{recipe.id}/get-link/', 200),
+            (self.client, 'get', f'{RECIPES_URL}feed/', 200),
+            (self.client, 'post', f'{RECIPES_URL}{recipe.id}/favorite/', 201),
+            (self.client, 'post',
+             f'{RECIPES_URL}{recipe.id}/shopping_cart/', 201),
+            (self.client, 'get',
+             f'{RECIPES_URL}download_shopping_cart/', 200),
+            (self.client, 'delete',
+             f'{RECIPES_URL}{recipe.id}/shopping_cart/', 204),
+        ))
+
+    def test_user_budgets(self):
+        self.assert_budgets((
+            (self.guest, 'get', '/api/users/', 200),
+            (self.client, 'get', '/api/users/', 200),
+            (self.client, 'get', f'/api/users/{self.author.id}/', 200),
+            (self.client, 'get', '/api/users/me/', 200),
+            (self.client, 'get', '/api/users/subscriptions/', 200),
+        ))
+
+    def test_ingredient_budgets(self):
+        ingredient_index.index = None
+        self.assert_budgets((
+            (self.guest, 'get', '/api/ingredients/', 200),
+            (self.guest, 'get',
+             f'/api/ingredients/{self.ingredients[0].id}/', 200),
+        ))
+
+    def test_streaming_queries_are_counted(self):
+        url = f'{RECIPES_URL}download_shopping_cart/'
+
+        def render(recipes, products):
+            yield from shopping_list_render(recipes, products)
+            # Лишний запрос при отдаче тела, после заголовков.
+            Tag.objects.count()
+
+        response = self.client.get(url)
+        assert_query_budget(response)
+        self.assertEqual(response.query_stats.count, 3)
+        with mock.patch('api.views.shopping_list_render', render):
+            with self.assertLogs('api.middleware', 'WARNING'):
+                response = self.client.get(url)
+                with self.assertRaises(AssertionError):
+                    assert_query_budget(response)
+        self.assertEqual(response.query_stats.count, 4)
+
+    def test_over_budget_fails(self):
+        with mock.patch.dict(RecipeViewSet.query_budgets, {'list': 1}):
+            with self.assertLogs('api.middleware', 'WARNING'):
+                response = self.guest.get(RECIPES_URL)
+        with self.assertRaises(AssertionError):
+            assert_query_budget(response)
+
+
+class CatalogTest(APITestCase):
+    """Кеширование и условные запросы справочников."""
+
+    url = '/api/ingredients/?name=%D0%BF%D1%80%D0%BE%D0%B4'
+
+    def test_ingredients_conditional_get(self):
+        response = self.guest.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), len(self.ingredients))
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_ingredients_gzip(self):
+        plain = self.guest.get(self.url)
+        response = self.guest.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+
+    def test_ingredients_limit_is_validated(self):
+        response = self.guest.get('/api/ingredients/?limit=x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_ingredients_list_is_cached_per_query(self):
+        self.guest.get(self.url)
+        with self.assertNumQueries(0):
+            self.guest.get(self.url)
+        ingredient_index.index = None
+        with self.assertNumQueries(1):
+            response = self.guest.get('/api/ingredients/?limit=1')
+        self.assertEqual(len(response.json()), 1)
+
+    def test_version_expires_in_process_cache(self):
+        with mock.patch.object(cache, 'add') as add:
+            get_catalog_version()
+        add.assert_called_once_with(
+            CATALOG_VERSION_KEY, mock.ANY, CATALOG_VERSION_TTL
+        )
+
+    def test_new_ingredient_is_listed(self):
+        self.guest.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(
+                name='продукт новый', measurement_unit='г'
+            )
+            # До фиксации выдача и версия прежние.
+            response = self.guest.get(self.url)
+            self.assertEqual(len(response.json()), len(self.ingredients))
+        response = self.guest.get(self.url)
+        self.assertEqual(len(response.json()), len(self.ingredients) + 1)
+
+    def test_version_is_kept_on_rollback(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with transaction.atomic():
+                Ingredient.objects.create(
+                    name='продукт новый', measurement_unit='г'
+                )
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(get_catalog_version(), version)
+
+
+@skipIf(sys.platform == 'win32', 'Нет resource.getrusage.')
+class AvatarUploadTest(APITestCase):
+    """Загрузка картинок не декодирует их целиком в памяти."""
+
+    # Рост пика памяти процесса на загрузку; картинка 6000x6000 в
+    # памяти заняла бы 108 МБ.
+    max_rss_growth_kb = 32 * 1024
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, content):
+        peak = peak_rss_kb()
+        response = self.client.put(
+            AVATAR_URL,
+            {'avatar': SimpleUploadedFile('avatar.png', content,
+                                          'image/png')},
+            format='multipart'
+        )
+        self.assertLess(peak_rss_kb() - peak, self.max_rss_growth_kb)
+        return response
+
+    def test_large_image(self):
+        response = self.upload(solid_png(6000, 6000))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['avatar'])
+
+    def test_too_many_pixels(self):
+        response = self.upload(solid_png(8000, 8000, rows=0))
+        self.assertEqual(response.status_code, 400)
+
+    def test_decompression_bomb(self):
+        response = self.upload(solid_png(20000, 20000, rows=0))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('avatar', response.json())
+
+    def test_not_an_image(self):
+        response = self.upload(b'not an image')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,79 @@
+"""Загрузка картинок файлом (multipart) наряду с base64 в JSON.
+
+Файл из multipart пишется на диск по частям, не собираясь в памяти,
+размер проверяется по ходу приема, а размеры картинки - по заголовку,
+до полного декодирования.
+"""
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
+from constants import (
+    MAX_IMAGE_PIXELS, MAX_IMAGE_UPLOAD_SIZE, UPLOAD_IMAGE_FORMATS
+)
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Прием файлов во временный файл с ограничением размера."""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # Заведомо большой запрос отклоняем до чтения тела.
+        if content_length > MAX_IMAGE_UPLOAD_SIZE * 2:
+            raise MultiPartParserError(
+                f'Запрос больше {MAX_IMAGE_UPLOAD_SIZE * 2} байт.'
+            )
+        return super().handle_raw_input(
+            input_data, META, content_length, boundary, encoding
+        )
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > MAX_IMAGE_UPLOAD_SIZE:
+            self.file.close()
+            raise MultiPartParserError(
+                f'Файл больше {MAX_IMAGE_UPLOAD_SIZE} байт.'
+            )
+        return super().receive_data_chunk(raw_data, start)
+
+
+def validate_image_header(file):
+    """Проверяем формат и размеры картинки, читая только заголовок."""
+    if file.size > MAX_IMAGE_UPLOAD_SIZE:
+        raise ValidationError(f'Файл больше {MAX_IMAGE_UPLOAD_SIZE} байт.')
+    try:
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        # Pillow отказывается открывать заведомо огромные картинки.
+        raise ValidationError(
+            f'Картинка больше {MAX_IMAGE_PIXELS} точек.'
+        )
+    except (UnidentifiedImageError, OSError):
+        raise ValidationError('Файл не является картинкой.')
+    finally:
+        file.seek(0)
+    if image_format not in UPLOAD_IMAGE_FORMATS:
+        raise ValidationError(f'Формат {image_format} не поддерживается.')
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValidationError(
+            f'Картинка {width}x{height} больше {MAX_IMAGE_PIXELS} точек.'
+        )
+
+
+class ImageUploadField(Base64ImageField):
+    """Картинка строкой base64 или файлом из multipart-запроса."""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            data = super().to_internal_value(data)
+        if data is not None:
+            validate_image_header(data)
+        return data
@@ -1,6 +1,7 @@
-from django.db.models import F, Sum
+from django.db.models import F, Prefetch, prefetch_related_objects
 from django.http import (
-    FileResponse, HttpResponseBadRequest, HttpResponseNotFound
+    Http404, HttpResponseBadRequest, HttpResponseNotFound,
+    StreamingHttpResponse
 )
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
@@ -8,29 +9,60 @@ from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.catalog import CatalogCacheMixin
+from api.filters import RecipeFilter
+from api.ingredients import ingredient_index
+from api.pagination import FeedPagination, RecipePagination
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (
     ExtendedUserSerializer, GetRecipeSerializer, IngredientSerializer,
-    WriteRecipeSerializer, ShortRecipeSerializer, SubscribeUserSerializer,
-    TagSerializer
+    RecipeIdsSerializer, WriteRecipeSerializer, ShortRecipeSerializer,
+    SubscribeUserSerializer, TagSerializer
 )
 from api.service import shopping_list_render
 from constants import SHOPPING_CART_FILENAME
+from recipes.marks import MarkSets
 from recipes.models import (
-    Favorite, Ingredient, IngredientInRecipe, Recipe, ShoppingCart, Subscribe,
-    Tag, User
+    CartProduct, Favorite, Ingredient, Recipe, ShoppingCart, Subscribe, Tag,
+    User
 )
+from recipes.shortlinks import encode, recipe_ids
 
 
 class ExtendedUserViewSet(UserViewSet):
     """Расширение вьюсета пользователя djoser для работы с подпиской."""
 
     permission_classes = [IsAuthorOrReadOnly]
+    # Бюджеты запросов к базе по действиям (см. api.middleware).
+    query_budgets = {'list': 3, 'retrieve': 2, 'me': 2, 'subscriptions': 4}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['list', 'retrieve']:
+            return queryset.with_subscription(self.request.user)
+        return queryset
+
+    def get_recipes_limit(self):
+        """Ограничение числа рецептов автора в подписках."""
+        limit = self.request.query_params.get('recipes_limit')
+        if limit is None:
+            return None
+        if not limit.isdigit() or int(limit) < 1:
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается целое положительное число.'}
+            )
+        return int(limit)
+
+    def get_subscribe_context(self):
+        return {
+            'request': self.request,
+            'recipes_limit': self.get_recipes_limit(),
+        }
 
     @action(["get", "put", "patch", "delete"], detail=False,
             permission_classes=[IsAuthenticated])
@@ -57,10 +89,12 @@ class ExtendedUserViewSet(UserViewSet):
         )
         if not created:
             return HttpResponseBadRequest(f'Подписка на {author} уже есть.')
+        # Счетчик подписчиков обновлен в базе сигналом.
+        author.refresh_from_db(fields=['followers_count'])
         return Response(
             SubscribeUserSerializer(
                 author,
-                context={'request': request}
+                context=self.get_subscribe_context()
             ).data,
             status=status.HTTP_201_CREATED
         )
@@ -68,12 +102,21 @@ class ExtendedUserViewSet(UserViewSet):
     @action(["get"], detail=False)
     def subscriptions(self, request, *args, **kwargs):
         """Список юзеров, на которых подписан автор запроса, (с рецептами)."""
-        queryset = User.objects.filter(authors__user=self.request.user)
-        page = self.paginate_queryset(queryset)
+        context = self.get_subscribe_context()
+        page = self.paginate_queryset(
+            User.objects.subscriptions(self.request.user)
+        )
+        # Рецепты всех авторов страницы подгружаем одним запросом.
+        limit = context['recipes_limit']
+        recipes = (
+            Recipe.objects.all() if limit is None
+            else Recipe.objects.top_per_author(page, limit)
+        )
+        prefetch_related_objects(page, Prefetch(
+            'recipes', queryset=recipes, to_attr='recipes_preview'
+        ))
         return self.get_paginated_response(
-            SubscribeUserSerializer(
-                page, many=True, context={'request': request}
-            ).data
+            SubscribeUserSerializer(page, many=True, context=context).data
         )
 
     @action(["put", "delete"], detail=False, url_path=r'me/avatar')
@@ -100,24 +143,36 @@ class ExtendedUserViewSet(UserViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для получения тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    query_budgets = {'list': 1, 'retrieve': 1}
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
     """Вьюсет для получения продуктов."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+    query_budgets = {'list': 1, 'retrieve': 1}
+
+    def render_catalog(self, request, *args, **kwargs):
+        # Поиск по началу названия отвечает из индекса в памяти.
+        limit = request.query_params.get('limit')
+        if limit is not None and not limit.isdigit():
+            raise ValidationError(
+                {'limit': 'Ожидается целое неотрицательное число.'}
+            )
+        return ingredient_index.search(
+            request.query_params.get('name', ''),
+            limit=None if limit is None else int(limit)
+        )
 
 
 class RecipeViewSet(ModelViewSet):
@@ -127,6 +182,24 @@ class RecipeViewSet(ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
+    query_budgets = {
+        'list': 7, 'retrieve': 6, 'get_link': 2, 'download_shopping_cart': 3,
+        'feed': 6, 'favorite': 5, 'favorite_bulk': 5,
+        'shopping_cart': 9, 'shopping_cart_bulk': 9,
+    }
+
+    def get_queryset(self):
+        # Для показа рецептов подгружаем связи и отметки заранее.
+        if self.action in ['list', 'retrieve']:
+            return Recipe.objects.for_read(self.request.user)
+        return super().get_queryset()
+
+    def get_serializer_context(self):
+        return {
+            **super().get_serializer_context(),
+            'marks': MarkSets(self.request.user),
+        }
 
     def get_serializer_class(self, *args, **kwargs):
         # Для показа рецептов используем отдельный сериализатор.
@@ -137,30 +210,64 @@ class RecipeViewSet(ModelViewSet):
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
+    def get_recipe_id(self, pk):
+        if not pk.isdigit():
+            raise Http404(f'Запрошенного рецепта {pk} не существует.')
+        return int(pk)
+
     def add_recipe_mark(self, recipe_id, model):
         """Добавляем к рецепту отметку избранное/корзина."""
-        recipe = get_object_or_404(Recipe, id=recipe_id)
-        mark, created = model.objects.get_or_create(
-            user=self.request.user, recipe=recipe
+        added, marked, _ = model.objects.add_marks(
+            self.request.user, [self.get_recipe_id(recipe_id)]
         )
-        if not created:
+        if marked:
             return HttpResponseBadRequest(
                 f'Запрещено повторное добавление рецепта {recipe_id} в '
                 f'{model._meta.verbose_name}.'
             )
+        if not added:
+            raise Http404(f'Запрошенного рецепта {recipe_id} не существует.')
         return Response(
-            ShortRecipeSerializer(recipe).data,
+            ShortRecipeSerializer(added[0]).data,
             status=status.HTTP_201_CREATED
         )
 
     def delete_recipe_mark(self, recipe_id, model):
-        get_object_or_404(
-            model,
-            user=self.request.user,
-            recipe_id=recipe_id
-        ).delete()
+        removed, _, _ = model.objects.remove_marks(
+            self.request.user, [self.get_recipe_id(recipe_id)]
+        )
+        if not removed:
+            raise Http404(
+                f'Рецепта {recipe_id} нет в {model._meta.verbose_name}.'
+            )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def bulk_recipe_marks(self, request, model):
+        """Отметки на список рецептов с итогом по каждому id."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            added, marked, missing = model.objects.add_marks(
+                request.user, recipe_ids
+            )
+            outcomes = {
+                **{recipe.pk: 'added' for recipe in added},
+                **{pk: 'exists' for pk in marked},
+            }
+        else:
+            removed, unmarked, missing = model.objects.remove_marks(
+                request.user, recipe_ids
+            )
+            outcomes = {
+                **{pk: 'removed' for pk in removed},
+                **{pk: 'absent' for pk in unmarked},
+            }
+        outcomes.update({pk: 'not_found' for pk in missing})
+        return Response({'results': [
+            {'id': pk, 'status': outcomes[pk]} for pk in recipe_ids
+        ]})
+
     @action(methods=["post", "delete"], detail=True)
     def favorite(self, request, pk):
         if request.method == 'POST':
@@ -168,6 +275,12 @@ class RecipeViewSet(ModelViewSet):
             return self.add_recipe_mark(recipe_id=pk, model=Favorite)
         return self.delete_recipe_mark(recipe_id=pk, model=Favorite)
 
+    @action(methods=["post", "delete"], detail=False, url_path='favorite',
+            url_name='favorite-bulk')
+    def favorite_bulk(self, request):
+        """Избранное для списка рецептов."""
+        return self.bulk_recipe_marks(request, Favorite)
+
     @action(methods=["post", "delete"], detail=True)
     def shopping_cart(self, request, pk):
         """Работа с корзиной покупок."""
@@ -175,14 +288,32 @@ class RecipeViewSet(ModelViewSet):
             return self.add_recipe_mark(recipe_id=pk, model=ShoppingCart)
         return self.delete_recipe_mark(recipe_id=pk, model=ShoppingCart)
 
+    @action(methods=["post", "delete"], detail=False,
+            url_path='shopping_cart', url_name='shopping-cart-bulk')
+    def shopping_cart_bulk(self, request):
+        """Корзина для списка рецептов (например, всего меню)."""
+        return self.bulk_recipe_marks(request, ShoppingCart)
+
+    @action(methods=["get"], detail=False,
+            permission_classes=[IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Лента: рецепты авторов из подписок, новые первыми."""
+        page = self.paginate_queryset(
+            Recipe.objects.for_read(request.user).feed(request.user)
+        )
+        return self.get_paginated_response(GetRecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        ).data)
+
     @action(methods=["get"], detail=True, url_path="get-link",
             permission_classes=[AllowAny])
     def get_link(self, request, pk):
         """Получение короткой ссылки."""
-        if Recipe.objects.filter(id=pk).exists():
+        if pk.isdigit() and recipe_ids.exists(int(pk)):
             return Response(
                 {'short-link': request.build_absolute_uri(
-                    reverse('recipes:short_link', args=[pk])
+                    reverse('recipes:short_link', args=[encode(int(pk))])
                 )},
                 status=status.HTTP_200_OK
             )
@@ -194,20 +325,23 @@ class RecipeViewSet(ModelViewSet):
     def download_shopping_cart(self, request):
         """Выгрузка корзины покупок файлом."""
         user = self.request.user
-        recipe_qs = Recipe.objects.filter(shoppingcarts__user=user)
-        product_qs = IngredientInRecipe.objects.filter(
-            recipe__shoppingcarts__user=user
-        ).values(
+        recipe_qs = Recipe.objects.filter(
+            shoppingcarts__user=user
+        ).select_related('author')
+        # Список покупок поддерживается по разницам при изменении корзины.
+        product_qs = CartProduct.objects.filter(user=user).values(
+            'amount',
             product=F('ingredient__name'),
             unit=F('ingredient__measurement_unit')
-        ).annotate(
-            amount=Sum('amount')
         ).order_by(
             'ingredient__name'
         )
-        return FileResponse(
+        # Список покупок отдается потоком по мере формирования строк.
+        response = StreamingHttpResponse(
             shopping_list_render(recipes=recipe_qs, products=product_qs),
-            content_type='text/plain',
-            as_attachment=True,
-            filename=SHOPPING_CART_FILENAME
+            content_type='text/plain; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{SHOPPING_CART_FILENAME}"'
         )
+        return response
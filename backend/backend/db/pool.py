@@ -0,0 +1,208 @@
+"""Пул соединений с базой в процессе и проверка соединений перед запросом.
+
+Пул включается ключом POOL настроек базы ({'SIZE': ..., 'TIMEOUT': ...}):
+соединения закрытые Django (в конце запроса при CONN_MAX_AGE = 0)
+возвращаются в пул и выдаются следующим запросам любого потока
+процесса. Открытых соединений не больше SIZE, поток ждет свободное не
+дольше TIMEOUT секунд.
+
+CONN_HEALTH_CHECKS повторяет настройку Django 4.1: перед первым запросом
+к базе в каждом запросе к API соединение, открытое раньше, проверяется,
+и разорванное (перезапуск базы, обрыв по простою) заменяется новым, а не
+роняет запрос ошибкой.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+from functools import partial
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    """Свободное соединение не появилось за время ожидания."""
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений DB-API с метриками."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+        self.metrics = Counter()
+
+    def checkout(self, connect):
+        """Соединение из пула или новое: (соединение, взято ли из пула)."""
+        if not self.slots.acquire(blocking=False):
+            start = time.monotonic()
+            acquired = self.slots.acquire(timeout=self.timeout)
+            with self.lock:
+                self.metrics['waits'] += 1
+                self.metrics['wait_ms'] += (time.monotonic() - start) * 1000
+                if not acquired:
+                    self.metrics['timeouts'] += 1
+            if not acquired:
+                raise PoolTimeout(
+                    f'Нет свободного соединения с базой за {self.timeout} с'
+                )
+        with self.lock:
+            if self.idle:
+                self.metrics['checkouts'] += 1
+                return self.idle.pop(), True
+        try:
+            connection = connect()
+        except Exception:
+            self.slots.release()
+            with self.lock:
+                self.metrics['errors'] += 1
+            raise
+        with self.lock:
+            self.metrics['checkouts'] += 1
+            self.metrics['creations'] += 1
+        return connection, False
+
+    def checkin(self, connection, discard=False):
+        try:
+            if discard:
+                with self.lock:
+                    self.metrics['discards'] += 1
+                connection.close()
+            else:
+                with self.lock:
+                    self.idle.append(connection)
+        finally:
+            self.slots.release()
+
+    def clear(self):
+        """Закрытие свободных соединений."""
+        with self.lock:
+            idle, self.idle = list(self.idle), deque()
+            self.metrics['discards'] += len(idle)
+        for connection in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            idle = len(self.idle)
+        return {
+            'size': self.size,
+            'open': (
+                metrics.get('creations', 0) - metrics.get('discards', 0)
+            ),
+            'idle': idle,
+            **metrics,
+        }
+
+
+def get_pool(wrapper):
+    """Пул соединений базы или None, если он не включен."""
+    pool = pools.get(wrapper.alias)
+    if pool is not None:
+        return pool
+    options = wrapper.settings_dict.get('POOL') or {}
+    # Закрытие соединения с базой SQLite в памяти ее уничтожает.
+    if not options.get('SIZE') or (
+        wrapper.vendor == 'sqlite' and wrapper.is_in_memory_db()
+    ):
+        return None
+    with pools_lock:
+        return pools.setdefault(wrapper.alias, ConnectionPool(
+            options['SIZE'], options.get('TIMEOUT', 10)
+        ))
+
+
+def close_pools():
+    """Закрытие пулов, когда ни одно соединение не выдано.
+
+    Пулы создаются заново при следующем соединении, по текущим настройкам.
+    """
+    with pools_lock:
+        closed = list(pools.values())
+        pools.clear()
+    for pool in closed:
+        pool.clear()
+
+
+def pool_stats():
+    """Метрики пулов соединений процесса по базам."""
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+# Соединения мастер-процесса gunicorn воркеры не закрывают (это закрыло
+# бы их и у мастера), а просто забывают.
+os.register_at_fork(after_in_child=pools.clear)
+
+
+class PooledDatabaseWrapperMixin:
+    """Пул и проверка соединений для DatabaseWrapper бекэнда Django."""
+
+    health_check_done = False
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self)
+        if pool is None:
+            # Новое соединение проверять незачем.
+            self.health_check_done = True
+            return super().get_new_connection(conn_params)
+        try:
+            connection, reused = pool.checkout(
+                partial(super().get_new_connection, conn_params)
+            )
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+        # Соединение могло разорваться, пока лежало в пуле.
+        self.health_check_done = not reused
+        return connection
+
+    def _close(self):
+        pool = get_pool(self)
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Соединение с незавершенной транзакцией или после ошибки, когда
+        # база недоступна, в пул не возвращаем.
+        discard = (
+            self.in_atomic_block
+            or not self.autocommit
+            or self.errors_occurred and not self.is_usable()
+        )
+        pool.checkin(self.connection, discard)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Начало или конец запроса к API: следующий запрос к базе
+        # проверит соединение заново.
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or self.health_check_done
+            or self.in_atomic_block
+            or not self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            return
+        if not self.is_usable():
+            pool = get_pool(self)
+            if pool is not None:
+                # Разрыв скорее всего общий (перезапуск базы): свободные
+                # соединения пула тоже мертвы.
+                pool.clear()
+            self.errors_occurred = True
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        # Соединение из пула берется при подключении, проверяем его после.
+        # Закрытое проверкой соединение super() откроет заново.
+        self.ensure_connection()
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
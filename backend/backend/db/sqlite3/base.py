@@ -0,0 +1,7 @@
+from django.db.backends.sqlite3 import base
+
+from backend.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """SQLite с пулом соединений и их проверкой перед запросом."""
@@ -0,0 +1,67 @@
+"""Проверки состояния для балансировщика нагрузки."""
+import logging
+
+from django.core.cache import cache
+from django.db import connections
+from django.http import JsonResponse
+
+from backend import warmup
+from backend.db.pool import pool_stats
+
+logger = logging.getLogger(__name__)
+
+READY_KEY = 'readyz'
+
+
+def check_database():
+    for connection in connections.all():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+def check_cache():
+    cache.set(READY_KEY, 1, 10)
+    if cache.get(READY_KEY) != 1:
+        raise RuntimeError('Кеш не возвращает записанное значение.')
+
+
+def healthz(request):
+    """Процесс жив и отвечает; зависимости не проверяются."""
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    """Процесс готов принимать запросы: база и кеш доступны, прогрев прошел.
+
+    Если прогрева не было (запуск без gunicorn.conf.py или база была
+    недоступна), он выполняется при проверке: балансировщик не пустит
+    запросы к процессу до его окончания. Неудавшийся прогрев повторяется
+    не чаще WARMUP_RETRY_INTERVAL.
+
+    Проверка доступна без авторизации: в ответе только ok/failed, текст
+    ошибок (адрес базы, пользователь) пишется в лог.
+    """
+    checks = {}
+    for name, check in (('database', check_database), ('cache', check_cache)):
+        try:
+            check()
+        except Exception:
+            logger.warning('Проверка готовности %s не прошла', name,
+                           exc_info=True)
+            checks[name] = 'failed'
+        else:
+            checks[name] = 'ok'
+    checks['warmup'] = (
+        'ok' if checks['database'] == 'ok' and warmup.retry_warmup()
+        else 'failed'
+    )
+    ready = all(result == 'ok' for result in checks.values())
+    return JsonResponse(
+        {
+            'status': 'ok' if ready else 'unavailable',
+            'checks': checks,
+            # Метрики пула соединений воркера, ответившего на проверку.
+            'db_pools': pool_stats(),
+        },
+        status=200 if ready else 503
+    )
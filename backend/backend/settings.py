@@ -9,6 +9,10 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv('SECRET_KEY', 'Default secret key')
 
+# Соль алфавита коротких ссылок на рецепты (recipes.shortlinks). После
+# смены соли выданные ссылки перестают работать.
+SHORT_LINK_SALT = os.getenv('SHORT_LINK_SALT', '')
+
 # Режим отладки включается в .env
 DEBUG = os.getenv('DEBUG') == 'True'
 
@@ -24,6 +28,12 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 AVATARS_URL = 'user_avatars'
 
+# Файлы из multipart пишутся на диск по частям с ограничением размера.
+FILE_UPLOAD_HANDLERS = ['api.uploads.LimitedUploadHandler']
+
+# Потоки для построения копий картинок рецептов, 0 - строить сразу.
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -50,6 +60,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Статистика запросов к базе в заголовках ответов включается в .env
+if os.getenv('DB_QUERY_STATS') == 'True':
+    MIDDLEWARE.insert(0, 'api.middleware.QueryStatsMiddleware')
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -77,7 +91,7 @@ AUTH_USER_MODEL = 'recipes.User'
 if os.getenv('DB_SQLITE', 'False') != 'True':
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'backend.db.postgresql',
             'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
             'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
@@ -88,11 +102,36 @@ if os.getenv('DB_SQLITE', 'False') != 'True':
 else:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': 'backend.db.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
         }
     }
 
+# Соединения с базой (backend.db.pool): время жизни соединения между
+# запросами (сек, 0 - закрывать после запроса, None - без ограничения),
+# проверка открытого ранее соединения перед запросом и пул соединений
+# процесса (0 - без пула; при пуле CONN_MAX_AGE стоит оставить 0, чтобы
+# соединение возвращалось в пул после каждого запроса).
+conn_max_age = os.getenv('DB_CONN_MAX_AGE', '0')
+DATABASES['default'].update(
+    CONN_MAX_AGE=None if conn_max_age == 'None' else int(conn_max_age),
+    CONN_HEALTH_CHECKS=os.getenv('DB_CONN_HEALTH_CHECKS') == 'True',
+    POOL={
+        'SIZE': int(os.getenv('DB_POOL_SIZE', 0)),
+        'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    },
+)
+
+# Общий для процессов кеш задается в .env, по дефолту кеш в памяти.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
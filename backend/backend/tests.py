@@ -0,0 +1,196 @@
+import os
+import tempfile
+import time
+from unittest import mock, skipUnless
+
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from backend import warmup
+from backend.db.pool import close_pools, get_pool, pools
+from constants import WARMUP_RETRY_INTERVAL
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+ALIAS = 'pool_test'
+
+
+class SQLitePoolTest(SimpleTestCase):
+    """Пул соединений и проверка соединений перед запросом."""
+
+    def database(self, **options):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return {
+            'ENGINE': 'backend.db.sqlite3',
+            'NAME': os.path.join(directory.name, 'pool.sqlite3'),
+            **options,
+        }
+
+    def setUp(self):
+        self.addCleanup(close_pools)
+
+    def connect(self, pool_size=2, timeout=10, **options):
+        """Обертка соединения в отдельном наборе соединений."""
+        settings_dict = getattr(self, 'settings_dict', None)
+        if settings_dict is None:
+            settings_dict = self.settings_dict = self.database()
+        settings_dict.update(
+            CONN_MAX_AGE=0,
+            POOL={'SIZE': pool_size, 'TIMEOUT': timeout},
+            **options
+        )
+        wrapper = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.dummy'},
+            ALIAS: settings_dict,
+        })[ALIAS]
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def query(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()[0]
+
+    def test_checkin_and_reuse(self):
+        wrapper = self.connect()
+        self.query(wrapper)
+        raw = wrapper.connection
+        wrapper.close()
+        self.assertIsNone(wrapper.connection)
+        self.assertEqual(self.query(wrapper), 1)
+        self.assertIs(wrapper.connection, raw)
+        stats = get_pool(wrapper).stats()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['creations'], 1)
+
+    def test_timeout(self):
+        first = self.connect(pool_size=1, timeout=0.05)
+        second = self.connect(pool_size=1, timeout=0.05)
+        self.query(first)
+        with self.assertRaises(OperationalError):
+            self.query(second)
+        self.assertEqual(get_pool(first).stats()['timeouts'], 1)
+        first.close()
+        self.assertEqual(self.query(second), 1)
+
+    def test_discard_in_atomic_block(self):
+        wrapper = self.connect()
+        self.query(wrapper)
+        raw = wrapper.connection
+        wrapper.in_atomic_block = True
+        try:
+            wrapper.close()
+        finally:
+            wrapper.in_atomic_block = False
+            wrapper.needs_rollback = False
+            wrapper.connection = None
+        stats = get_pool(wrapper).stats()
+        self.assertEqual(stats['discards'], 1)
+        self.assertEqual(stats['idle'], 0)
+        self.query(wrapper)
+        self.assertIsNot(wrapper.connection, raw)
+
+    def test_health_check_replaces_broken_connection(self):
+        wrapper = self.connect(CONN_HEALTH_CHECKS=True)
+        self.query(wrapper)
+        broken = wrapper.connection
+        wrapper.close()
+        # Начало запроса к API: соединение из пула надо проверить.
+        wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(
+            type(wrapper), 'is_usable',
+            lambda self: self.connection is not broken
+        ):
+            self.assertEqual(self.query(wrapper), 1)
+        self.assertIsNot(wrapper.connection, broken)
+        stats = get_pool(wrapper).stats()
+        self.assertEqual(stats['creations'], 2)
+        self.assertEqual(stats['discards'], 1)
+
+    @skipUnless(hasattr(os, 'fork'), 'Нет os.fork.')
+    def test_fork_forgets_pools(self):
+        wrapper = self.connect()
+        self.query(wrapper)
+        wrapper.close()
+        self.assertIn(ALIAS, pools)
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if not pools else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        # В родителе пул и свободное соединение на месте.
+        self.assertEqual(get_pool(wrapper).stats()['idle'], 1)
+
+    def test_no_pool_for_memory_database(self):
+        wrapper = self.connect(NAME=':memory:')
+        self.assertIsNone(get_pool(wrapper))
+
+
+@skipUnless(
+    psycopg2 is not None and os.getenv('POOL_TEST_POSTGRES') == 'True',
+    'Нужны psycopg2 и PostgreSQL (POOL_TEST_POSTGRES=True).'
+)
+class PostgreSQLPoolTest(SQLitePoolTest):
+    """Те же проверки на PostgreSQL из настроек POSTGRES_* и DB_*."""
+
+    def database(self, **options):
+        return {
+            'ENGINE': 'backend.db.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
+            'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'db'),
+            'PORT': os.getenv('DB_PORT', 5432),
+            **options,
+        }
+
+    def test_no_pool_for_memory_database(self):
+        self.skipTest('Только для SQLite.')
+
+
+class ReadyzTest(SimpleTestCase):
+    """Проверка готовности без подробностей ошибок и частых прогревов."""
+
+    def setUp(self):
+        for target in (
+            mock.patch.object(warmup, 'warmed', False),
+            mock.patch.object(warmup, 'failed_at', None),
+            # Прогрев не закрывает соединения тестов.
+            mock.patch.object(warmup, 'connections'),
+            mock.patch.object(warmup, 'close_pools'),
+        ):
+            target.start()
+            self.addCleanup(target.stop)
+        patcher = mock.patch('backend.health.check_database')
+        self.check_database = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_error_details_are_only_logged(self):
+        self.check_database.side_effect = OperationalError(
+            'could not connect to server: host "db.internal", user "secret"'
+        )
+        with self.assertLogs('backend.health', 'WARNING') as logs:
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks'], {
+            'database': 'failed', 'cache': 'ok', 'warmup': 'failed'
+        })
+        self.assertNotIn(b'db.internal', response.content)
+        self.assertIn('db.internal', '\n'.join(logs.output))
+
+    def test_failed_warmup_is_retried_after_interval(self):
+        with mock.patch.object(
+            warmup, 'build_serializers', side_effect=OperationalError
+        ) as build, self.assertLogs('backend.warmup', 'ERROR'):
+            for _ in range(3):
+                response = self.client.get('/readyz')
+                self.assertEqual(response.status_code, 503)
+            self.assertEqual(build.call_count, 1)
+            warmup.failed_at = time.monotonic() - WARMUP_RETRY_INTERVAL - 1
+            self.client.get('/readyz')
+            self.assertEqual(build.call_count, 2)
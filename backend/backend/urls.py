@@ -1,8 +1,12 @@
 from django.contrib import admin
 from django.urls import include, path
 
+from backend.health import healthz, readyz
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
     path('', include('recipes.urls')),
 ]
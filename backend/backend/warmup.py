@@ -0,0 +1,110 @@
+"""Прогрев процесса перед приемом запросов.
+
+Основные запросы чтения прогоняются через тестовый клиент Django: так
+импортируются ленивые модули, строятся маршруты, цепочка middleware,
+поля сериализаторов, кеш справочников и индекс продуктов. При
+preload_app (gunicorn.conf.py) прогревается мастер-процесс, и воркеры
+получают все это готовым через copy-on-write.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+
+from api.serializers import (
+    ExtendedUserSerializer, RecipeIdsSerializer, WriteRecipeSerializer
+)
+from backend.db.pool import close_pools
+from constants import WARMUP_RETRY_INTERVAL, WARMUP_ROUNDS
+from recipes.models import Recipe
+from recipes.shortlinks import encode
+
+logger = logging.getLogger(__name__)
+
+WARMUP_PATHS = (
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/ingredients/?name=%D0%B0',
+    '/api/recipes/',
+    '/api/recipes/?limit=6&page=2',
+    '/api/recipes/?cursor=',
+)
+
+lock = threading.Lock()
+warmed = False
+# Время неудавшейся попытки прогрева, по time.monotonic().
+failed_at = None
+
+
+def recipe_paths():
+    recipe_id = Recipe.objects.order_by('-pub_date').values_list(
+        'id', flat=True
+    ).first()
+    if recipe_id is None:
+        return ()
+    return (f'/api/recipes/{recipe_id}/', f'/s/{encode(recipe_id)}')
+
+
+def build_serializers():
+    """Поля сериализаторов записи: чтением они не строятся."""
+    for serializer in (
+        ExtendedUserSerializer, RecipeIdsSerializer, WriteRecipeSerializer
+    ):
+        serializer().fields
+
+
+def warmup():
+    """Прогрев; False, если он не удался (нет базы)."""
+    global warmed, failed_at
+    with lock:
+        if warmed:
+            return True
+        start = time.monotonic()
+        client = Client()
+        try:
+            build_serializers()
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS,
+                                                  'testserver']):
+                paths = (*WARMUP_PATHS, *recipe_paths()) * WARMUP_ROUNDS
+                failed = {
+                    path for path in paths
+                    if client.get(path).status_code >= 500
+                }
+        except Exception:
+            # Без базы процесс все равно стартует: готовность покажет
+            # /readyz, прогрев повторится при его запросе.
+            logger.exception('Прогрев не удался')
+            failed_at = time.monotonic()
+            return False
+        finally:
+            # Соединения мастер-процесса не должны достаться воркерам.
+            connections.close_all()
+            close_pools()
+        # Ошибка в ответе - дефект кода, а не неготовность процесса: из-за
+        # нее не выводим из работы все процессы.
+        if failed:
+            logger.warning('Прогрев: ошибки в ответах на %s', sorted(failed))
+        warmed = True
+        logger.info('Прогрев за %.2f с', time.monotonic() - start)
+        return True
+
+
+def retry_warmup():
+    """Прогрев для проверки готовности, не чаще WARMUP_RETRY_INTERVAL.
+
+    Повтор полного прогрева на каждую проверку нагружал бы базу, которая
+    только что была недоступна. Проверки во время идущего прогрева его не
+    ждут.
+    """
+    if warmed:
+        return True
+    if lock.locked() or (
+        failed_at is not None
+        and time.monotonic() - failed_at < WARMUP_RETRY_INTERVAL
+    ):
+        return False
+    return warmup()
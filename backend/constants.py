@@ -14,13 +14,61 @@ ADMIN_PIC_DOTS = 50
 USERNAME_PATTERN = r'^[\w.@+-]+\Z'
 # Аватар пользователя по умолчанию.
 DEFAULT_USER_AVATAR = f'{AVATARS_URL}/default_user_avatar.jpg'
+# Уменьшенные копии картинок рецептов: наибольшая сторона в точках
+# и форматы (расширение файла: формат Pillow).
+IMAGE_VARIANT_SIZES = {'small': 320, 'medium': 640}
+IMAGE_VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+# Ограничения загружаемых картинок: размер файла в байтах, число точек
+# и форматы Pillow.
+MAX_IMAGE_UPLOAD_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000
+UPLOAD_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
 # Минимальное время готовки.
 MIN_COOKING_MINUTES = 1
 # Минимальное количество ингредиента.
 MIN_INGREDIENT_AMOUNT = 1
 
+# Время хранения первой страницы ленты подписок (сек).
+FEED_CACHE_TIMEOUT = 30
+
+# Время хранения отметок пользователя в общем кеше (сек), ключ
+# сбрасывается при изменении отметок.
+MARK_SETS_TIMEOUT = 60 * 10
+
+# Короткие ссылки: сколько id рецептов помнить в процессе, время жизни
+# известного и отсутствующего id (сек), время хранения редиректа
+# браузером и прокси (сек): после удаления рецепта ссылка ведет на него
+# не дольше этого.
+SHORT_LINK_CACHE_SIZE = 100_000
+SHORT_LINK_HIT_TTL = 60 * 5
+SHORT_LINK_MISS_TTL = 10
+SHORT_LINK_MAX_AGE = 60 * 5
+
+# Наибольшее число рецептов в одном запросе на отметки пачкой.
+MAX_BULK_MARKS = 100
+
+# Время жизни индекса продуктов в памяти процесса (сек).
+INGREDIENT_INDEX_TTL = 300
+
+# Время хранения справочников в кеше (сек), ключи версионные.
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+# Время жизни версии справочников в кеше процесса (сек): за это время
+# изменения из других процессов попадают в выдачу.
+CATALOG_VERSION_TTL = 60
+
+# Проходов запросов при прогреве процесса (backend.warmup): интерпретатор
+# оптимизирует код, выполненный несколько раз.
+WARMUP_ROUNDS = 3
+# Не чаще чем раз в столько секунд /readyz повторяет неудавшийся прогрев.
+WARMUP_RETRY_INTERVAL = 30
+
 # Имя файла для выгрузки списка покупок продуктов.
 SHOPPING_CART_FILENAME = 'shopping_cart.txt'
+# Месяцы для даты в списке покупок.
+MONTHS = (
+    'января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля',
+    'августа', 'сентября', 'октября', 'ноября', 'декабря',
+)
 # Заготовки для форматирования вывода списка покупок.
 header_layout = 'СПИСОК ПОКУПОК (составлен {})'
 products_layout = "{}. {} ({}) - {}"
@@ -0,0 +1,60 @@
+"""Настройки gunicorn: gunicorn -c gunicorn.conf.py.
+
+Число воркеров и потоков задается в .env, по умолчанию - от числа
+доступных процессору ядер. При GUNICORN_THREADS > 1 воркеры с потоками
+(gthread), иначе синхронные.
+
+Приложение загружается и прогревается в мастер-процессе (preload_app)
+до запуска воркеров, и они получают его готовым через copy-on-write.
+"""
+import gc
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+cpus = (
+    len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity')
+    else os.cpu_count() or 1
+)
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = env_int('GUNICORN_WORKERS', cpus * 2 + 1)
+threads = env_int('GUNICORN_THREADS', 1)
+timeout = env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = env_int('GUNICORN_KEEPALIVE', 5)
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+wsgi_app = 'backend.wsgi:application'
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+
+def run_warmup(log):
+    from backend.warmup import warmup
+
+    if warmup():
+        log.info('Приложение прогрето')
+    else:
+        log.warning('Прогрев не удался, его повторит /readyz')
+
+
+def when_ready(server):
+    # Воркеров еще нет: прогреваем мастер, а объекты приложения убираем
+    # из обхода сборщика мусора, чтобы он не копировал их страницы
+    # в каждом воркере.
+    if preload_app:
+        run_warmup(server.log)
+        gc.collect()
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        run_warmup(worker.log)
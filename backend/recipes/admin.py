@@ -1,12 +1,13 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
+from django.db.models import Count, Prefetch
 from django.utils.safestring import mark_safe
 
 from constants import ADMIN_PIC_DOTS
 from recipes.models import (
-    Favorite, Ingredient, IngredientInRecipe, Recipe, ShoppingCart, Subscribe,
-    Tag, User
+    CartProduct, Favorite, Ingredient, IngredientInRecipe, Recipe,
+    ShoppingCart, Subscribe, Tag, User
 )
 
 admin.site.unregister(Group)
@@ -68,9 +69,15 @@ class RecipesCountMixin:
 
     list_display = ['recipes_count', ]
 
-    @admin.display(description='Рецептов')
+    def get_queryset(self, request):
+        # Число рецептов считается в том же запросе, что и список.
+        return super().get_queryset(request).annotate(
+            recipes_count=Count('recipes')
+        )
+
+    @admin.display(description='Рецептов', ordering='recipes_count')
     def recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
 
 @admin.register(User)
@@ -100,13 +107,17 @@ class FoodgramUserAdmin(UserAdmin, RecipesCountMixin):
     def name(self, user):
         return f'{user.first_name} {user.last_name}'
 
-    @admin.display(description='Подписок')
+    @admin.display(description='Рецептов', ordering='recipes_count')
+    def recipes_count(self, user):
+        return user.recipes_count
+
+    @admin.display(description='Подписок', ordering='follows_count')
     def subscribed_count(self, user):
-        return user.follows.count()
+        return user.follows_count
 
-    @admin.display(description='Подписчиков')
+    @admin.display(description='Подписчиков', ordering='followers_count')
     def authors_count(self, user):
-        return user.authors.count()
+        return user.followers_count
 
     @mark_safe
     @admin.display(description='Аватар')
@@ -185,9 +196,30 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('tags', 'author')
     inlines = (RecipeIngredientsInline, )
 
-    @admin.display(description='В избранном')
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = dict(form.instance.ingredients_in_recipe.values_list(
+            'ingredient_id', 'amount'
+        )) if change else {}
+        super().save_related(request, form, formsets, change)
+        # Корзины с рецептом получают разницу по продуктам.
+        CartProduct.objects.update_for_recipe(form.instance, old_amounts)
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorited_count(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_count
 
     @mark_safe
     @admin.display(description='Теги')
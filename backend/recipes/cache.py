@@ -0,0 +1,15 @@
+"""Общий для процессов сервера кеш."""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+
+# Кеши в памяти процесса: ключ, сброшенный в одном воркере gunicorn,
+# остается в остальных.
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias=DEFAULT_CACHE_ALIAS):
+    """Виден ли сброс ключа кеша всем процессам сервера."""
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
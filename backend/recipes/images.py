@@ -0,0 +1,109 @@
+"""Уменьшенные копии картинок рецептов.
+
+Копии всех размеров IMAGE_VARIANT_SIZES в форматах IMAGE_VARIANT_FORMATS
+строятся в фоновом пуле потоков после сохранения рецепта и кладутся рядом
+с оригиналом. Готовые пути записываются в Recipe.image_variants вместе с
+именем исходной картинки (source), по которому видно, что копии актуальны.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image
+
+from constants import IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_SIZES
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = (
+    ThreadPoolExecutor(
+        max_workers=settings.IMAGE_VARIANT_WORKERS,
+        thread_name_prefix='image-variants'
+    ) if settings.IMAGE_VARIANT_WORKERS else None
+)
+
+
+def render_variants(image_name):
+    """Строим и сохраняем копии картинки, возвращаем их пути."""
+    stem = os.path.splitext(image_name)[0]
+    with default_storage.open(image_name) as file, Image.open(file) as image:
+        image = image.convert('RGB')
+        variants = {}
+        for size_name, size in IMAGE_VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            variants[size_name] = {}
+            for extension, image_format in IMAGE_VARIANT_FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, image_format, quality=80)
+                variants[size_name][extension] = default_storage.save(
+                    f'{stem}_{size_name}.{extension}',
+                    ContentFile(buffer.getvalue())
+                )
+    return variants
+
+
+def delete_variants(image_variants):
+    for size in image_variants.get('sizes', {}).values():
+        for name in size.values():
+            default_storage.delete(name)
+
+
+def build_variants(recipe_id, image_name):
+    try:
+        old_variants = Recipe.objects.filter(pk=recipe_id).values_list(
+            'image_variants', flat=True
+        ).first() or {}
+        variants = render_variants(image_name)
+        # Картинку могли заменить, пока строились копии: тогда они уже
+        # не нужны.
+        if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+            image_variants={'source': image_name, 'sizes': variants}
+        ):
+            delete_variants(old_variants)
+        else:
+            delete_variants({'sizes': variants})
+    except Exception:
+        logger.exception('Не удалось построить копии картинки %s', image_name)
+    finally:
+        if executor is not None:
+            connections.close_all()
+
+
+def schedule_variants(recipe):
+    """Ставим построение копий в очередь, если картинка сменилась."""
+    if not recipe.image or recipe.image_variants.get('source') == (
+        recipe.image.name
+    ):
+        return
+    if executor is None:
+        build_variants(recipe.pk, recipe.image.name)
+    else:
+        executor.submit(build_variants, recipe.pk, recipe.image.name)
+
+
+def variant_urls(recipe, build_url):
+    """Адреса копий картинки; пока копии не готовы - адрес оригинала."""
+    variants = recipe.image_variants
+    sizes = (
+        variants.get('sizes', {})
+        if variants.get('source') == recipe.image.name else {}
+    )
+    original = build_url(recipe.image.url)
+
+    def url(size_name, extension):
+        name = sizes.get(size_name, {}).get(extension)
+        return build_url(default_storage.url(name)) if name else original
+
+    return {
+        size_name: {
+            extension: url(size_name, extension)
+            for extension in IMAGE_VARIANT_FORMATS
+        } for size_name in IMAGE_VARIANT_SIZES
+    }
@@ -0,0 +1,43 @@
+"""Общее для команд замеров производительности."""
+
+import argparse
+import statistics
+import subprocess
+
+from django.conf import settings
+
+
+def positive_int(value):
+    """Тип аргумента числа повторов: без замеров нечего считать."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('Нужно целое число больше 0.')
+    return number
+
+
+def latency_stats(timings, elapsed):
+    """Задержки (мс) в процентилях и пропускная способность."""
+    # quantiles нужны хотя бы два замера; один замер - все процентили.
+    percentiles = (
+        statistics.quantiles(timings, n=100, method='inclusive')
+        if len(timings) > 1 else timings * 99
+    )
+    return {
+        'requests': len(timings),
+        'p50_ms': round(percentiles[49], 3),
+        'p95_ms': round(percentiles[94], 3),
+        'p99_ms': round(percentiles[98], 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'throughput_rps': round(len(timings) / elapsed, 1),
+    }
+
+
+def git_commit():
+    """Коммит кода или None, если git или репозитория нет (в образе)."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True,
+            text=True, cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,17 @@
+from django.db import connection
+from django.db.models import Max
+
+
+def bulk_create_with_ids(model, objects, batch_size=None):
+    """bulk_create, после которого у объектов есть id.
+
+    SQLite не возвращает id из bulk_create: выдаем их сами, вызывать
+    внутри транзакции.
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        next_id = (
+            model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        ) + 1
+        for obj_id, obj in enumerate(objects, next_id):
+            obj.id = obj_id
+    return model.objects.bulk_create(objects, batch_size=batch_size)
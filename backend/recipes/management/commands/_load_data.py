@@ -1,39 +1,174 @@
+import csv
 import json
+import os
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
+from api.catalog import bump_catalog_version
+
+READ_SIZE = 64 * 1024
+
+
+def iter_json_array(file):
+    """Элементы JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = file.read(READ_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def skip(chars):
+        """Пропускаем пробелы и разделители, дочитывая файл по мере нужды.
+        """
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in chars:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip(' \t\r\n')
+    if buffer[position:position + 1] != '[':
+        raise ValueError('Файл должен содержать JSON-массив.')
+    position += 1
+    while True:
+        skip(' \t\r\n,')
+        if buffer[position:position + 1] == ']':
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Элемент не уместился в буфер: дочитываем.
+                fill()
+        position = end
+        yield item
+
 
 class CommonCommand(BaseCommand):
-    """Скрипт для загрузки данных."""
+    """Скрипт для загрузки данных.
+
+    Читает JSON-массив или CSV потоком и сверяет записи с базой пачками
+    по ключу lookup_field: новые добавляет, измененные обновляет. Поля
+    CSV идут в порядке fields, без заголовка.
+    """
 
     @property
     def help(self):
-        return ('Импортирует данные из JSON в модель '
+        return ('Загружает данные из JSON или CSV в модель '
                 f'{self.model._meta.verbose_name_plural}.')
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            help='Файл .json или .csv, по умолчанию '
+                 f'{self.model.__name__.lower()}s.json из BASE_DIR.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Показать изменения, не сохраняя их.'
+        )
+
+    def read_rows(self, file, extension):
+        if extension == '.csv':
+            return (
+                dict(zip(self.fields, row)) for row in csv.reader(file)
+                if row
+            )
+        if extension == '.json':
+            return iter_json_array(file)
+        raise CommandError(f'Неизвестный формат файла {extension}.')
+
+    def upsert(self, rows):
+        """Сверяем пачку с базой, возвращаем добавленные и измененные."""
+        # Повтор ключа в файле: побеждает последняя запись.
+        items = {row[self.lookup_field]: row for row in rows}
+        existing = self.model.objects.in_bulk(
+            list(items), field_name=self.lookup_field
+        )
+        added, updated = [], []
+        for key, row in items.items():
+            obj = existing.get(key)
+            if obj is None:
+                obj = self.model(**row)
+                added.append(obj)
+            elif any(getattr(obj, field) != row[field] for field in row):
+                for field, value in row.items():
+                    setattr(obj, field, value)
+                updated.append(obj)
+            else:
+                continue
+            try:
+                obj.clean_fields()
+            except ValidationError as error:
+                raise CommandError(f'Запись {row}: {error}.')
+        self.model.objects.bulk_create(added)
+        # Вместо bulk_update с CASE на каждую запись - UPDATE на каждый
+        # набор новых значений: в справочниках они повторяются (единицы
+        # измерения), и запросов выходит мало.
+        fields = [f for f in self.fields if f != self.lookup_field]
+        groups = {}
+        for obj in updated:
+            groups.setdefault(
+                tuple(getattr(obj, field) for field in fields), []
+            ).append(obj.pk)
+        for values, pks in groups.items():
+            self.model.objects.filter(pk__in=pks).update(
+                **dict(zip(fields, values))
+            )
+        return added, updated, len(items) - len(added) - len(updated)
+
+    def report(self, label, objects):
+        if self.verbosity > 1:
+            for obj in objects:
+                self.stdout.write(f'{label} {obj}')
+
     @transaction.atomic
     def handle(self, *args, **options):
-        file_name = f'{self.model.__name__.lower()}s.json'
-        file_path = f'{settings.BASE_DIR}/{file_name}'
+        self.verbosity = options['verbosity']
+        path = options['path'] or os.path.join(
+            settings.BASE_DIR, f'{self.model.__name__.lower()}s.json'
+        )
+        extension = os.path.splitext(path)[1].lower()
+        added = updated = unchanged = 0
         try:
-            initial_count = self.model.objects.count()
-            with open(file_path, 'r', encoding='utf-8') as jsonfile:
-                data = json.load(jsonfile)
-                self.model.objects.bulk_create(
-                    (self.model(**item) for item in data),
-                    ignore_conflicts=True
-                )
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'Файл {file_name} загружен. Добавлено записей: '
-                        f'{self.model.objects.count() - initial_count}.'
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                rows = self.read_rows(file, extension)
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    batch_added, batch_updated, batch_unchanged = (
+                        self.upsert(batch)
                     )
-                )
-        except Exception as error:
-            self.stdout.write(
-                self.style.ERROR(
-                    f'Ошибка {error} при загрузке файла {file_name}.'
-                )
-            )
+                    self.report('+', batch_added)
+                    self.report('~', batch_updated)
+                    added += len(batch_added)
+                    updated += len(batch_updated)
+                    unchanged += batch_unchanged
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            raise CommandError(f'Ошибка {error} при загрузке файла {path}.')
+        if options['dry_run']:
+            transaction.set_rollback(True)
+        elif added or updated:
+            # bulk_create и bulk_update не отправляют сигналы сохранения.
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Файл {path} {"проверен" if options["dry_run"] else "загружен"}.'
+            f' Добавлено: {added}, обновлено: {updated}, '
+            f'без изменений: {unchanged}.'
+        ))
@@ -0,0 +1,174 @@
+"""Команда разбора планов запросов API."""
+
+import re
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Tag, User
+
+# Признаки плохого плана: полный просмотр таблицы и сортировка.
+PG_SCAN = re.compile(r'Seq Scan on (\w+)')
+PG_SORT = re.compile(r'(?<!Incremental )Sort(?: Key)?:? ')
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?!.*\bINDEX\b)')
+SQLITE_SORT = re.compile(r'TEMP B-TREE FOR (?:ORDER BY|GROUP BY)')
+
+
+class Command(BaseCommand):
+    help = ('Выполняет запросы основных действий API от имени пользователя, '
+            'выводит планы их SQL и отмечает полные просмотры таблиц и '
+            'сортировки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='email пользователя, по умолчанию - с '
+                           'наибольшим числом подписок.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз выполнить запрос для замера времени.'
+        )
+        parser.add_argument(
+            '--slow', type=float, default=1.0,
+            help='Порог времени запроса (мс), с которого отмечаются '
+                 'просмотры и сортировки: сортировка пары строк '
+                 'подгрузки связей индекса не требует.'
+        )
+
+    def get_user(self, email):
+        if email:
+            try:
+                return User.objects.get(email=email)
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {email}.')
+        user = User.objects.order_by('-follows_count').first()
+        if user is None:
+            raise CommandError('База пуста: сначала заполните ее.')
+        return user
+
+    def actions(self, user):
+        """Действия API: (название, адрес)."""
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        tag = Tag.objects.first()
+        actions = [
+            ('Рецепты', '/api/recipes/'),
+            ('Рецепты курсором', '/api/recipes/?cursor='),
+            ('Избранное', '/api/recipes/?is_favorited=1'),
+            ('Корзина', '/api/recipes/?is_in_shopping_cart=1'),
+            ('Лента', '/api/recipes/feed/?cursor='),
+            ('Подписки', '/api/users/subscriptions/?recipes_limit=3'),
+            ('Список покупок', '/api/recipes/download_shopping_cart/'),
+        ]
+        if tag is not None:
+            actions.append(
+                ('Рецепты по тегу', f'/api/recipes/?tags={tag.slug}')
+            )
+        if recipe is not None:
+            actions += [
+                ('Рецепт', f'/api/recipes/{recipe.pk}/'),
+                ('Рецепты автора', f'/api/recipes/?author={recipe.author_id}'),
+            ]
+        return actions
+
+    def capture(self, client, url):
+        """SQL запросов к базе, выполненных при обработке адреса."""
+        queries = []
+
+        def collect(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(collect):
+            response = client.get(url)
+            if response.streaming:
+                # Запросы потокового ответа выполняются при его чтении.
+                b''.join(response.streaming_content)
+        return response.status_code, [
+            (sql, params) for sql, params in queries
+            if sql.lstrip().upper().startswith('SELECT')
+        ]
+
+    def explain(self, sql, params):
+        if connection.vendor == 'postgresql':
+            prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+        elif connection.vendor == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        else:
+            raise CommandError(f'База {connection.vendor} не поддерживается.')
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+        # В SQLite последняя колонка - текст шага плана.
+        return [row[-1] for row in rows]
+
+    def problems(self, plan):
+        if connection.vendor == 'postgresql':
+            scan, sort = PG_SCAN, PG_SORT
+        else:
+            scan, sort = SQLITE_SCAN, SQLITE_SORT
+        found = []
+        for line in plan:
+            step = line.strip().lstrip('->').strip()
+            match = scan.search(step)
+            if match:
+                found.append(f'полный просмотр {match.group(1)}')
+            if sort.search(step):
+                found.append('сортировка')
+        return found
+
+    def timing(self, sql, params, repeat):
+        """Лучшее время выполнения запроса, мс."""
+        best = None
+        with connection.cursor() as cursor:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        self.stdout.write(
+            f'Пользователь {user.email}, база {connection.vendor}.'
+        )
+        flagged = total = 0
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS,
+                                              'testserver']):
+            for name, url in self.actions(user):
+                status, queries = self.capture(client, url)
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'\n{name} {url}: ответ {status}, '
+                    f'запросов {len(queries)}'
+                ))
+                for sql, params in queries:
+                    plan = self.explain(sql, params)
+                    elapsed = self.timing(sql, params, options['repeat'])
+                    problems = (
+                        self.problems(plan) if elapsed >= options['slow']
+                        else []
+                    )
+                    total += 1
+                    flagged += bool(problems)
+                    line = f'  {elapsed:8.2f} мс  {sql[:90]}'
+                    self.stdout.write(
+                        self.style.WARNING(line) if problems else line
+                    )
+                    for problem in problems:
+                        self.stdout.write(self.style.WARNING(
+                            f'             ! {problem}'
+                        ))
+                    if options['verbosity'] > 1:
+                        for step in plan:
+                            self.stdout.write(f'             {step}')
+        self.stdout.write(self.style.SUCCESS(
+            f'\nЗапросов {total}, медленных с полным просмотром или '
+            f'сортировкой {flagged}.'
+        ))
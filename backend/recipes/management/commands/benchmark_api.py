@@ -0,0 +1,232 @@
+"""Команда нагрузочного замера API внутри процесса."""
+
+import json
+import platform
+import statistics
+import time
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.management.commands._benchmark import (
+    git_commit, latency_stats, positive_int
+)
+from recipes.models import Favorite, Recipe, ShoppingCart, Tag, User
+from recipes.shortlinks import encode
+
+INGREDIENT_PREFIXES = ('а', 'мол', 'сах', 'к', 'соль', 'п')
+# Пользователь с большой корзиной, создается на время замера.
+CART_USER = 'benchmark-cart'
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет основные запросы API через тестовый клиент Django и '
+            'выводит задержки (p50/p95/p99), число запросов к базе и '
+            'пропускную способность; с --output сохраняет их в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=positive_int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--only', help='Сценарии через запятую, по умолчанию все.'
+        )
+        parser.add_argument(
+            '--user', help='email пользователя, по умолчанию - с '
+                           'наибольшим числом подписок.'
+        )
+        parser.add_argument(
+            '--cart-size', type=int, default=300,
+            help='Рецептов в корзине для сценария large_cart_download.'
+        )
+        parser.add_argument('--output', help='Файл для отчета JSON.')
+
+    def create_cart_user(self, size):
+        """Пользователь с size самыми новыми рецептами в корзине."""
+        User.objects.filter(username=CART_USER).delete()
+        user = User.objects.create_user(
+            email=f'{CART_USER}@example.com', username=CART_USER,
+            first_name='Замер', last_name='Корзины'
+        )
+        ShoppingCart.objects.add_marks(user, list(
+            Recipe.objects.order_by('-pub_date').values_list(
+                'id', flat=True
+            )[:size]
+        ))
+        return user
+
+    def scenarios(self, user, cart_user):
+        """Сценарии: имя и функция запроса по номеру повтора."""
+        client, anonymous, cart_client = APIClient(), APIClient(), APIClient()
+        client.force_authenticate(user)
+        cart_client.force_authenticate(cart_user)
+        recipe_ids = list(Recipe.objects.order_by('-pub_date').values_list(
+            'id', flat=True
+        )[:100])
+        if not recipe_ids:
+            raise CommandError('В базе нет рецептов: запустите seed_data.')
+        unmarked = list(Recipe.objects.exclude(
+            favorites__user=user
+        ).exclude(shoppingcarts__user=user).values_list('id', flat=True)[:10])
+        tag = Tag.objects.first()
+        author_id = Recipe.objects.get(pk=recipe_ids[0]).author_id
+
+        def pick(items, number):
+            return items[number % len(items)]
+
+        def toggle(path, data=None):
+            def request(number):
+                method = client.post if number % 2 == 0 else client.delete
+                return method(path, data, format='json')
+            return request
+
+        return {
+            'recipes': lambda n: client.get('/api/recipes/'),
+            'recipes_cursor': lambda n: client.get('/api/recipes/?cursor='),
+            'recipes_by_tag': lambda n: client.get(
+                f'/api/recipes/?tags={tag.slug}'
+            ),
+            'recipes_by_author': lambda n: client.get(
+                f'/api/recipes/?author={author_id}'
+            ),
+            'recipes_favorited': lambda n: client.get(
+                '/api/recipes/?is_favorited=1'
+            ),
+            'recipe_detail': lambda n: client.get(
+                f'/api/recipes/{pick(recipe_ids, n)}/'
+            ),
+            'feed': lambda n: client.get('/api/recipes/feed/'),
+            'subscriptions': lambda n: client.get(
+                '/api/users/subscriptions/?recipes_limit=3'
+            ),
+            'download_shopping_cart': lambda n: client.get(
+                '/api/recipes/download_shopping_cart/'
+            ),
+            'large_cart_download': lambda n: cart_client.get(
+                '/api/recipes/download_shopping_cart/'
+            ),
+            'ingredient_search': lambda n: anonymous.get(
+                f'/api/ingredients/?name={pick(INGREDIENT_PREFIXES, n)}'
+            ),
+            'tags': lambda n: anonymous.get('/api/tags/'),
+            'short_link': lambda n: anonymous.get(
+                f'/s/{encode(pick(recipe_ids, n))}'
+            ),
+            'favorite_toggle': toggle(
+                f'/api/recipes/{unmarked[0]}/favorite/'
+            ),
+            'cart_toggle': toggle(
+                f'/api/recipes/{unmarked[0]}/shopping_cart/'
+            ),
+            'cart_bulk_toggle': toggle(
+                '/api/recipes/shopping_cart/', {'recipes': unmarked}
+            ),
+        }
+
+    def measure(self, request, count, warmup):
+        for number in range(warmup):
+            request(number)
+        timings, queries, statuses = [], [], Counter()
+        executed = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal executed
+            executed += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            # Четное число повторов: переключатели отметок возвращаются в
+            # исходное состояние.
+            for number in range(warmup, warmup + count):
+                executed = 0
+                start = time.perf_counter()
+                response = request(number)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - start) * 1000)
+                queries.append(executed)
+                statuses[response.status_code] += 1
+        elapsed = time.perf_counter() - started
+        return {
+            **latency_stats(timings, elapsed),
+            'queries_per_request': round(statistics.fmean(queries), 2),
+            'max_queries': max(queries),
+            'statuses': {
+                str(status): total for status, total in statuses.items()
+            },
+        }
+
+    def meta(self, user, cart_user):
+        return {
+            'commit': git_commit(),
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'user': user.email,
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'favorites': Favorite.objects.count(),
+            'shopping_carts': ShoppingCart.objects.count(),
+            'large_cart': cart_user.shoppingcarts.count(),
+            'large_cart_products': cart_user.cart_products.count(),
+        }
+
+    def handle(self, *args, **options):
+        user = (
+            User.objects.filter(email=options['user']).first()
+            if options['user']
+            else User.objects.order_by('-follows_count').first()
+        )
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        count = options['requests'] + options['requests'] % 2
+        cart_user = self.create_cart_user(options['cart_size'])
+        try:
+            report = self.run(user, cart_user, count, options)
+        finally:
+            cart_user.delete()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Отчет сохранен в {options["output"]}.'
+            ))
+
+    def run(self, user, cart_user, count, options):
+        report = {'meta': self.meta(user, cart_user), 'scenarios': {}}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS,
+                                              'testserver']):
+            scenarios = self.scenarios(user, cart_user)
+            names = (
+                options['only'].split(',') if options['only']
+                else list(scenarios)
+            )
+            unknown = set(names) - set(scenarios)
+            if unknown:
+                raise CommandError(
+                    f'Нет сценариев {", ".join(sorted(unknown))}.'
+                )
+            self.stdout.write(
+                f'{"сценарий":<24}{"p50":>9}{"p95":>9}{"p99":>9}'
+                f'{"зап/с":>9}{"SQL":>7}  ответы'
+            )
+            for name in names:
+                result = self.measure(
+                    scenarios[name], count, options['warmup']
+                )
+                report['scenarios'][name] = result
+                self.stdout.write(
+                    f'{name:<24}{result["p50_ms"]:>9.2f}'
+                    f'{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                    f'{result["throughput_rps"]:>9.0f}'
+                    f'{result["queries_per_request"]:>7.1f}  '
+                    f'{result["statuses"]}'
+                )
+        return report
@@ -0,0 +1,137 @@
+"""Команда замера затрат на соединения с базой."""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from backend.db.pool import (
+    PooledDatabaseWrapperMixin, close_pools, pool_stats
+)
+from recipes.management.commands._benchmark import (
+    git_commit, latency_stats, positive_int
+)
+
+# Режимы: имя, CONN_MAX_AGE, CONN_HEALTH_CHECKS и включен ли пул.
+MODES = (
+    ('close', 0, False, False),
+    ('persistent', None, False, False),
+    ('persistent_checked', None, True, False),
+    ('pool', 0, False, True),
+    ('pool_checked', 0, True, True),
+)
+QUERY = 'SELECT 1'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет запросы к API, выполняющие один запрос к базе, при '
+            'разных настройках соединений: закрытие после запроса, '
+            'постоянные соединения, пул; с проверкой соединений и без. '
+            'Выводит задержку на запрос и экономию относительно закрытия.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--requests', type=positive_int, default=2000)
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='Потоков, выполняющих запросы одновременно.'
+        )
+        parser.add_argument(
+            '--pool-size', type=int, default=4,
+            help='Размер пула для режимов pool; меньше --threads - '
+                 'потоки ждут соединений.'
+        )
+        parser.add_argument('--output', help='Файл для отчета JSON.')
+
+    def request(self, alias):
+        """Цикл запроса к API: сигналы начала и конца и запрос к базе."""
+        start = time.perf_counter()
+        request_started.send(sender=self.__class__)
+        with connections[alias].cursor() as cursor:
+            cursor.execute(QUERY)
+            cursor.fetchone()
+        request_finished.send(sender=self.__class__)
+        return (time.perf_counter() - start) * 1000
+
+    def thread_requests(self, alias, count):
+        try:
+            return [self.request(alias) for _ in range(count)]
+        finally:
+            connections[alias].close()
+
+    def run_mode(self, alias, options):
+        per_thread = options['requests'] // options['threads']
+        # Первые соединения и импорты не в счет.
+        self.thread_requests(alias, 10)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['threads']) as executor:
+            timings = [
+                ms for chunk in executor.map(
+                    lambda _: self.thread_requests(alias, per_thread),
+                    range(options['threads'])
+                ) for ms in chunk
+            ]
+        return latency_stats(timings, time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias not in connections:
+            raise CommandError(f'Нет базы {alias}.')
+        settings_dict = connections[alias].settings_dict
+        pooled = isinstance(connections[alias], PooledDatabaseWrapperMixin)
+        original = {
+            key: settings_dict.get(key)
+            for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'POOL')
+        }
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'database': connections[alias].vendor,
+                'threads': options['threads'],
+                'pool_size': options['pool_size'],
+            },
+            'modes': {},
+        }
+        self.stdout.write(
+            f'{"режим":<22}{"p50":>8}{"p95":>8}{"среднее":>9}'
+            f'{"экономия":>10}'
+        )
+        try:
+            for name, max_age, health_checks, pool in MODES:
+                if not pooled and (health_checks or pool):
+                    self.stdout.write(self.style.WARNING(
+                        f'{name:<22}нужен бекэнд backend.db.*'
+                    ))
+                    continue
+                connections[alias].close()
+                close_pools()
+                settings_dict.update(
+                    CONN_MAX_AGE=max_age,
+                    CONN_HEALTH_CHECKS=health_checks,
+                    POOL={'SIZE': options['pool_size'] if pool else 0},
+                )
+                result = self.run_mode(alias, options)
+                pools = pool_stats()
+                if alias in pools:
+                    result['pool'] = pools[alias]
+                report['modes'][name] = result
+                saved = (
+                    report['modes']['close']['mean_ms'] - result['mean_ms']
+                )
+                self.stdout.write(
+                    f'{name:<22}{result["p50_ms"]:>8.3f}'
+                    f'{result["p95_ms"]:>8.3f}{result["mean_ms"]:>9.3f}'
+                    f'{saved:>10.3f}'
+                )
+                if 'pool' in result:
+                    self.stdout.write(f'{"":<22}пул: {result["pool"]}')
+        finally:
+            connections[alias].close()
+            close_pools()
+            settings_dict.update(original)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,94 @@
+"""Команда сравнения индекса продуктов в памяти с запросом istartswith."""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.ingredients import IngredientIndex
+from recipes.management.commands._benchmark import (
+    git_commit, latency_stats, positive_int
+)
+from recipes.management.commands.benchmark_api import INGREDIENT_PREFIXES
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Замеряет поиск продуктов по началу названия: индекс в памяти '
+            'процесса (api.ingredients) против запроса ORM istartswith с '
+            'той же выдачей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prefix', action='append',
+            help=f'Начало названия, можно несколько; по умолчанию '
+                 f'{", ".join(INGREDIENT_PREFIXES)}.'
+        )
+        parser.add_argument('--repeat', type=positive_int, default=200)
+        parser.add_argument('--output', help='Файл для отчета JSON.')
+
+    def measure(self, search, prefixes, repeat):
+        timings = []
+        started = time.perf_counter()
+        for number in range(repeat):
+            prefix = prefixes[number % len(prefixes)]
+            start = time.perf_counter()
+            search(prefix)
+            timings.append((time.perf_counter() - start) * 1000)
+        return latency_stats(timings, time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        ingredients = Ingredient.objects.count()
+        if not ingredients:
+            raise CommandError(
+                'В базе нет продуктов: запустите load_ingredients.'
+            )
+        prefixes = options['prefix'] or INGREDIENT_PREFIXES
+        index = IngredientIndex()
+        start = time.perf_counter()
+        index.get_index()
+        build_ms = (time.perf_counter() - start) * 1000
+
+        def orm(prefix):
+            return list(Ingredient.objects.filter(
+                name__istartswith=prefix
+            ).order_by('name').values('id', 'name', 'measurement_unit'))
+
+        for prefix in prefixes:
+            if len(index.search(prefix)) != len(orm(prefix)):
+                # В SQLite LIKE не различает регистр только для латиницы.
+                self.stdout.write(self.style.WARNING(
+                    f'{prefix}: выдачи индекса и ORM не совпадают.'
+                ))
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'database': connection.vendor,
+                'ingredients': ingredients,
+                'prefixes': list(prefixes),
+                'index_build_ms': round(build_ms, 3),
+            },
+            'methods': {
+                'index': self.measure(
+                    index.search, prefixes, options['repeat']
+                ),
+                'istartswith': self.measure(
+                    orm, prefixes, options['repeat']
+                ),
+            },
+        }
+        self.stdout.write(
+            f'Продуктов: {ingredients}, индекс построен за {build_ms:.1f} мс'
+        )
+        self.stdout.write(
+            f'{"способ":<14}{"p50":>9}{"p95":>9}{"p99":>9}{"среднее":>9}'
+        )
+        for name, result in report['methods'].items():
+            self.stdout.write(
+                f'{name:<14}{result["p50_ms"]:>9.3f}{result["p95_ms"]:>9.3f}'
+                f'{result["p99_ms"]:>9.3f}{result["mean_ms"]:>9.3f}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
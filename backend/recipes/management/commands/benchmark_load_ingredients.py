@@ -0,0 +1,108 @@
+"""Команда замера загрузки большого файла продуктов."""
+
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.catalog import bump_catalog_version
+from recipes.management.commands._benchmark import git_commit
+from recipes.models import Ingredient
+
+# Начало названий созданных продуктов: по нему они удаляются после замера.
+NAME_PREFIX = 'замер'
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+def write_file(path, rows):
+    if path.endswith('.csv'):
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            csv.writer(file).writerows(
+                (row['name'], row['measurement_unit']) for row in rows
+            )
+    else:
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(rows, file, ensure_ascii=False)
+
+
+class Command(BaseCommand):
+    help = ('Создает файл с заданным числом продуктов и замеряет '
+            'load_ingredients: добавление, повторную загрузку без '
+            'изменений и обновление всех записей. Созданные продукты '
+            'затем удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--format', choices=('json', 'csv'),
+                            default='json')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--output', help='Файл для отчета JSON.')
+
+    def load(self, path, batch_size):
+        start = time.perf_counter()
+        call_command(
+            'load_ingredients', path, batch_size=batch_size, stdout=StringIO()
+        )
+        return round(time.perf_counter() - start, 3)
+
+    def handle(self, *args, **options):
+        generated = Ingredient.objects.filter(
+            name__startswith=f'{NAME_PREFIX} '
+        )
+        if generated.exists():
+            raise CommandError(
+                f'В базе уже есть продукты «{NAME_PREFIX} ...»: '
+                'прошлый замер не завершился.'
+            )
+        randomizer = random.Random(options['seed'])
+        rows = [
+            {
+                'name': f'{NAME_PREFIX} {number:07d}',
+                'measurement_unit': randomizer.choice(UNITS),
+            } for number in range(options['rows'])
+        ]
+        # Обновление: у каждого продукта меняется единица измерения.
+        changed = [
+            {**row, 'measurement_unit': randomizer.choice(
+                [unit for unit in UNITS if unit != row['measurement_unit']]
+            )} for row in rows
+        ]
+        timings = {}
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [
+                os.path.join(directory, f'{name}.{options["format"]}')
+                for name in ('ingredients', 'changed')
+            ]
+            write_file(paths[0], rows)
+            write_file(paths[1], changed)
+            try:
+                for name, path in (
+                    ('insert', paths[0]),
+                    ('noop', paths[0]),
+                    ('update', paths[1]),
+                ):
+                    timings[name] = self.load(path, options['batch_size'])
+                    self.stdout.write(f'{name:<8}{timings[name]:>9.2f} с')
+            finally:
+                generated.delete()
+                bump_catalog_version()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'meta': {
+                        'commit': git_commit(),
+                        'database': connection.vendor,
+                        'rows': options['rows'],
+                        'format': options['format'],
+                        'batch_size': options['batch_size'],
+                    },
+                    'seconds': timings,
+                }, file, ensure_ascii=False, indent=2)
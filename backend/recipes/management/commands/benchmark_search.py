@@ -0,0 +1,98 @@
+"""Команда сравнения полнотекстового поиска рецептов с icontains."""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+
+from recipes.management.commands._benchmark import (
+    git_commit, latency_stats, positive_int
+)
+from recipes.models import Recipe
+
+# Частое слово, слово с числом (редкое сочетание) и слово, которого нет.
+TERMS = ('рецепт', 'рецепт 777', 'описание 4242', 'щавель')
+
+
+def full_text(term):
+    return Recipe.objects.search(term).order_by('-search_rank', '-pub_date')
+
+
+def icontains(term):
+    return Recipe.objects.filter(
+        Q(name__icontains=term) | Q(text__icontains=term)
+    ).order_by('-pub_date')
+
+
+METHODS = {'search': full_text, 'icontains': icontains}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет выдачу первой страницы поиска рецептов с подсчетом '
+            'найденных: полнотекстовый поиск (параметр search) против '
+            'поиска подстроки icontains по названию и описанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--term', action='append',
+            help=f'Поисковый запрос, можно несколько; по умолчанию '
+                 f'{", ".join(TERMS)}.'
+        )
+        parser.add_argument('--repeat', type=positive_int, default=20)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--output', help='Файл для отчета JSON.')
+
+    def run(self, queryset, limit):
+        """Запросы страницы API: число найденных и первые рецепты."""
+        start = time.perf_counter()
+        count = queryset.count()
+        list(queryset.values_list('id', flat=True)[:limit])
+        return (time.perf_counter() - start) * 1000, count
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.count()
+        if not recipes:
+            raise CommandError('В базе нет рецептов: запустите seed_data.')
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'database': connection.vendor,
+                'recipes': recipes,
+            },
+            'terms': {},
+        }
+        self.stdout.write(
+            f'{"запрос":<20}{"способ":<11}{"найдено":>9}{"p50":>9}'
+            f'{"p95":>9}{"среднее":>9}'
+        )
+        for term in options['term'] or TERMS:
+            report['terms'][term] = {}
+            for name, method in METHODS.items():
+                queryset = method(term)
+                # Первый прогон прогревает кеш страниц базы.
+                _, count = self.run(queryset, options['limit'])
+                started = time.perf_counter()
+                timings = [
+                    self.run(queryset, options['limit'])[0]
+                    for _ in range(options['repeat'])
+                ]
+                result = {
+                    'found': count,
+                    **latency_stats(timings, time.perf_counter() - started),
+                }
+                report['terms'][term][name] = result
+                self.stdout.write(
+                    f'{term:<20}{name:<11}{count:>9}'
+                    f'{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+                    f'{result["mean_ms"]:>9.2f}'
+                )
+            results = report['terms'][term]
+            results['speedup'] = round(
+                results['icontains']['mean_ms'] / results['search']['mean_ms'],
+                1
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,22 @@
+"""Команда построения копий картинок рецептов."""
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии картинок рецептов, где их нет.'
+
+    def handle(self, *args, **options):
+        built = 0
+        for recipe in Recipe.objects.only('image', 'image_variants'):
+            if recipe.image and recipe.image_variants.get('source') != (
+                recipe.image.name
+            ):
+                build_variants(recipe.pk, recipe.image.name)
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Построены копии картинок рецептов: {built}.'
+        ))
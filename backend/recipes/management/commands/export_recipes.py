@@ -0,0 +1,83 @@
+"""Команда выгрузки рецептов в NDJSON."""
+
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from recipes.models import IngredientInRecipe, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты в NDJSON: строка на рецепт с тегами, '
+            'продуктами, автором и путем к картинке.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для выгрузки, "-" - стандартный вывод.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def batches(self, batch_size):
+        """Рецепты пачками по возрастанию id, со всеми связями."""
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        ).order_by('pk')
+        last_pk = 0
+        while True:
+            batch = list(recipes.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1].pk
+
+    def row(self, recipe):
+        return {
+            'id': recipe.pk,
+            'author': recipe.author.email,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date.isoformat(),
+            'image': recipe.image.name,
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': line.ingredient.name,
+                    'measurement_unit': line.ingredient.measurement_unit,
+                    'amount': line.amount,
+                } for line in recipe.ingredients_in_recipe.all()
+            ],
+        }
+
+    def handle(self, *args, **options):
+        output = (
+            sys.stdout if options['path'] == '-'
+            else open(options['path'], 'w', encoding='utf-8')
+        )
+        # Прогресс уходит в stderr, чтобы не смешиваться с выгрузкой.
+        progress = self.stderr if options['path'] == '-' else self.stdout
+        start, total = time.monotonic(), 0
+        try:
+            for batch in self.batches(options['batch_size']):
+                output.writelines(
+                    json.dumps(self.row(recipe), ensure_ascii=False) + '\n'
+                    for recipe in batch
+                )
+                total += len(batch)
+                progress.write(
+                    f'Выгружено рецептов: {total} '
+                    f'({total / (time.monotonic() - start):.0f}/с).'
+                )
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        progress.write(self.style.SUCCESS(f'Выгрузка завершена: {total}.'))
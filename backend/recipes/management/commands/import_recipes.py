@@ -0,0 +1,160 @@
+"""Команда загрузки рецептов из NDJSON (формат export_recipes)."""
+
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils.dateparse import parse_datetime
+
+from recipes.management.commands._bulk import bulk_create_with_ids
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag, User
+from recipes.search import index_recipes
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из NDJSON, выгруженного export_recipes. '
+            'Авторы, теги и продукты должны уже быть в базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с рецептами, "-" - стандартный ввод.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с места, где остановилась прошлая загрузка.'
+        )
+        parser.add_argument(
+            '--skip', type=int, default=0,
+            help='Пропустить первые N строк файла.'
+        )
+
+    def load_maps(self):
+        """Внешние ключи разрешаем по словарям, а не запросом на строку."""
+        self.authors = dict(User.objects.values_list('email', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        }
+
+    def parse(self, line):
+        """Рецепт, его теги и продукты из строки выгрузки."""
+        row = json.loads(line)
+        try:
+            author_id = self.authors[row['author']]
+        except KeyError:
+            raise ValueError(f'Нет автора {row["author"]}.')
+        unknown = [slug for slug in row['tags'] if slug not in self.tags]
+        if unknown:
+            raise ValueError(f'Нет тегов {", ".join(unknown)}.')
+        amounts = {}
+        for item in row['ingredients']:
+            key = (item['name'], item['measurement_unit'])
+            if key not in self.ingredients:
+                raise ValueError(f'Нет продукта {key[0]} ({key[1]}).')
+            amounts[self.ingredients[key]] = item['amount']
+        recipe = Recipe(
+            author_id=author_id,
+            name=row['name'],
+            text=row['text'],
+            cooking_time=row['cooking_time'],
+            pub_date=parse_datetime(row['pub_date']),
+            image=row['image'],
+        )
+        return recipe, {self.tags[slug] for slug in row['tags']}, amounts
+
+    @transaction.atomic
+    def save_batch(self, batch):
+        """Пачка рецептов со связями - одна транзакция."""
+        recipes = [recipe for recipe, _, _ in batch]
+        bulk_create_with_ids(Recipe, recipes)
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            ) for recipe, _, amounts in batch
+            for ingredient_id, amount in amounts.items()
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+            for recipe, tag_ids, _ in batch for tag_id in tag_ids
+        )
+        # bulk_create не отправляет сигналы: счетчики и поисковый индекс
+        # обновляем сами.
+        added = {}
+        for recipe in recipes:
+            added[recipe.author_id] = added.get(recipe.author_id, 0) + 1
+        User.objects.filter(pk__in=added).update(recipes_count=F(
+            'recipes_count'
+        ) + Case(
+            *(When(pk=pk, then=Value(count)) for pk, count in added.items())
+        ))
+        index_recipes(recipes)
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return int(file.read())
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, path, line_number):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(str(line_number))
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = None if path == '-' else f'{path}.progress'
+        if options['resume'] and checkpoint is None:
+            raise CommandError('--resume работает только с файлом.')
+        start_line = options['skip']
+        if options['resume']:
+            start_line = max(start_line, self.read_checkpoint(checkpoint))
+        self.load_maps()
+        source = (
+            sys.stdin if path == '-' else open(path, encoding='utf-8')
+        )
+        start, loaded, errors = time.monotonic(), 0, 0
+        try:
+            lines = enumerate(islice(source, start_line, None), start_line)
+            while True:
+                chunk = list(islice(lines, options['batch_size']))
+                if not chunk:
+                    break
+                batch = []
+                for line_number, line in chunk:
+                    if not line.strip():
+                        continue
+                    try:
+                        batch.append(self.parse(line))
+                    except (ValueError, KeyError, TypeError) as error:
+                        errors += 1
+                        self.stderr.write(
+                            f'Строка {line_number + 1} пропущена: {error}'
+                        )
+                if batch:
+                    self.save_batch(batch)
+                    loaded += len(batch)
+                # Отметку ставим после фиксации пачки: повторный запуск
+                # с --resume не загрузит ее второй раз.
+                if checkpoint is not None:
+                    self.write_checkpoint(checkpoint, chunk[-1][0] + 1)
+                self.stdout.write(
+                    f'Загружено рецептов: {loaded}, пропущено строк: '
+                    f'{errors} '
+                    f'({loaded / (time.monotonic() - start):.0f}/с).'
+                )
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        if checkpoint is not None and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена: {loaded}. Копии картинок строит '
+            'build_image_variants.'
+        ))
@@ -6,3 +6,6 @@ from recipes.models import Ingredient
 
 class Command(CommonCommand):
     model = Ingredient
+    lookup_field = 'name'
+    # Порядок колонок в CSV.
+    fields = ('name', 'measurement_unit')
@@ -6,3 +6,6 @@ from recipes.models import Tag
 
 class Command(CommonCommand):
     model = Tag
+    lookup_field = 'slug'
+    # Порядок колонок в CSV.
+    fields = ('name', 'slug')
@@ -0,0 +1,60 @@
+"""Команда сверки и пересборки списков покупок."""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import CartProduct
+
+
+class Command(BaseCommand):
+    help = ('Сверяет списки покупок с корзинами пользователей и '
+            'пересобирает их.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить, не изменяя данные.'
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        live = {
+            (row['user_id'], row['ingredient_id']): row['total']
+            for row in CartProduct.objects.live_aggregate()
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in CartProduct.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        mismatches = [
+            key for key in {*live, *stored} if live.get(key) != stored.get(key)
+        ]
+        for user_id, ingredient_id in sorted(mismatches):
+            self.stdout.write(
+                f'Пользователь {user_id}, продукт {ingredient_id}: '
+                f'в списке {stored.get((user_id, ingredient_id))}, '
+                f'по корзине {live.get((user_id, ingredient_id))}.'
+            )
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок совпадают с корзинами ({len(live)} строк).'
+            ))
+            return
+        if options['check']:
+            raise CommandError(f'Расхождений: {len(mismatches)}.')
+        CartProduct.objects.all().delete()
+        CartProduct.objects.bulk_create(
+            (
+                CartProduct(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=total
+                ) for (user_id, ingredient_id), total in live.items()
+            ),
+            batch_size=1000
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны, исправлено расхождений: '
+            f'{len(mismatches)}.'
+        ))
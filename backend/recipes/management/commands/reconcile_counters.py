@@ -0,0 +1,41 @@
+"""Команда сверки счетчиков рецептов и пользователей."""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q
+
+from recipes.models import Recipe, User
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счетчики рецептов и пользователей со связанными '
+            'таблицами и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить, не изменяя данные.'
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        total = 0
+        for model in (Recipe, User):
+            counts = model.objects.actual_counts()
+            mismatched = model.objects.annotate(**{
+                f'actual_{field}': count for field, count in counts.items()
+            }).filter(Q(*(
+                ~Q(**{field: F(f'actual_{field}')}) for field in counts
+            ), _connector=Q.OR))
+            found = mismatched.count()
+            total += found
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: расхождений {found}.'
+            )
+            if found and not options['check']:
+                model.objects.filter(
+                    pk__in=mismatched.values('pk')
+                ).update(**counts)
+        if total and options['check']:
+            raise CommandError(f'Расхождений в счетчиках: {total}.')
+        self.stdout.write(self.style.SUCCESS('Счетчики сверены.'))
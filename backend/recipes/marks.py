@@ -0,0 +1,87 @@
+"""Отметки пользователя (избранное и корзина) в кеше.
+
+Id отмеченных рецептов загружаются одним запросом на запрос API в
+отсортированные массивы чисел. Флаги is_favorited и is_in_shopping_cart
+после этого - поиск в массиве без обращения к базе.
+
+Если кеш общий для процессов (CACHE_BACKEND), массивы хранятся в нем
+между запросами, по ключу на пользователя; ключ сбрасывается после
+фиксации любой записи в отметки пользователя. Кеш в памяти процесса для
+этого не годится: сброс в одном воркере не виден остальным, и они
+показывали бы старые отметки.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Value
+
+from constants import MARK_SETS_TIMEOUT
+from recipes.cache import cache_is_shared
+
+# Имя флага в выдаче: модель отметки.
+MARK_MODELS = {
+    'is_favorited': 'Favorite',
+    'is_in_shopping_cart': 'ShoppingCart',
+}
+# Целые со знаком в 8 байт, как у BigAutoField.
+ID_TYPECODE = 'q'
+
+
+def mark_sets_key(user_id):
+    # Тип элементов в ключе: байты массивов другого типа не прочитать.
+    return f'marks:{ID_TYPECODE}:{user_id}'
+
+
+def invalidate_marks(user_id):
+    if not cache_is_shared():
+        return
+    # До фиксации читатель закешировал бы отметки заново из старых данных.
+    transaction.on_commit(lambda: cache.delete(mark_sets_key(user_id)))
+
+
+def load_mark_sets(user_id):
+    """Массивы id рецептов по флагам, из общего кеша или одним запросом."""
+    shared = cache_is_shared()
+    stored = cache.get(mark_sets_key(user_id)) if shared else None
+    if stored is None:
+        ids = {name: [] for name in MARK_MODELS}
+        queries = [
+            apps.get_model('recipes', model_name).objects.filter(
+                user_id=user_id
+            ).values_list(
+                'recipe_id', Value(name, output_field=CharField())
+            ) for name, model_name in MARK_MODELS.items()
+        ]
+        for recipe_id, name in queries[0].union(*queries[1:], all=True):
+            ids[name].append(recipe_id)
+        stored = {
+            name: array(ID_TYPECODE, sorted(recipe_ids)).tobytes()
+            for name, recipe_ids in ids.items()
+        }
+        if shared:
+            cache.set(mark_sets_key(user_id), stored, MARK_SETS_TIMEOUT)
+    sets = {}
+    for name, data in stored.items():
+        sets[name] = array(ID_TYPECODE)
+        sets[name].frombytes(data)
+    return sets
+
+
+class MarkSets:
+    """Отметки пользователя запроса, загружаемые при первом обращении."""
+
+    def __init__(self, user):
+        self.user = user
+        self.sets = None
+
+    def has(self, name, recipe_id):
+        if not self.user.is_authenticated:
+            return False
+        if self.sets is None:
+            self.sets = load_mark_sets(self.user.pk)
+        ids = self.sets[name]
+        index = bisect_left(ids, recipe_id)
+        return index < len(ids) and ids[index] == recipe_id
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_cart_products(apps, schema_editor):
+    """Заполняем списки покупок по уже собранным корзинам."""
+    CartProduct = apps.get_model('recipes', 'CartProduct')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    CartProduct.objects.bulk_create(
+        (
+            CartProduct(
+                user_id=row['user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['total']
+            ) for row in IngredientInRecipe.objects.filter(
+                recipe__shoppingcarts__isnull=False
+            ).values(
+                'ingredient_id', user_id=models.F('recipe__shoppingcarts__user')
+            ).annotate(total=models.Sum('amount')).order_by()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(verbose_name='Мера')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_products', to='recipes.ingredient', verbose_name='Продукт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_products', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'продукт в списке покупок',
+                'verbose_name_plural': 'Продукты в списках покупок',
+                'default_related_name': 'cart_products',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartproduct',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_in_cart_products'),
+        ),
+        migrations.RunPython(fill_cart_products, migrations.RunPython.noop),
+    ]
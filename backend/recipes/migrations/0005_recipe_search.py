@@ -0,0 +1,76 @@
+"""Схема полнотекстового поиска рецептов (см. recipes.search).
+
+PostgreSQL: колонка tsvector, триггер с русским стеммингом и GIN-индекс.
+SQLite: виртуальная таблица FTS5. Прочие базы ищут без индекса.
+"""
+from django.db import migrations
+
+RECIPE_TABLE = 'recipes_recipe'
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_CONFIG = 'russian'
+
+PG_FORWARD = (
+    f'ALTER TABLE {RECIPE_TABLE} ADD COLUMN search_vector tsvector',
+    f"""
+    CREATE FUNCTION {RECIPE_TABLE}_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}',
+                                  coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}',
+                                     coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE TRIGGER {RECIPE_TABLE}_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, text ON {RECIPE_TABLE}
+    FOR EACH ROW EXECUTE PROCEDURE {RECIPE_TABLE}_search_vector()
+    """,
+    # Триггер на UPDATE OF name заполняет колонку для старых рецептов.
+    f'UPDATE {RECIPE_TABLE} SET name = name',
+    f'CREATE INDEX {RECIPE_TABLE}_search_vector_gin '
+    f'ON {RECIPE_TABLE} USING gin (search_vector)',
+)
+PG_BACKWARD = (
+    f'DROP TRIGGER {RECIPE_TABLE}_search_vector_update ON {RECIPE_TABLE}',
+    f'DROP FUNCTION {RECIPE_TABLE}_search_vector()',
+    f'ALTER TABLE {RECIPE_TABLE} DROP COLUMN search_vector',
+)
+SQLITE_FORWARD = (
+    f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(name, text)',
+    f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+    f'SELECT id, name, text FROM {RECIPE_TABLE}',
+)
+SQLITE_BACKWARD = (f'DROP TABLE {FTS_TABLE}',)
+
+
+def run_statements(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement, params=None)
+
+
+def create_search_schema(apps, schema_editor):
+    run_statements(
+        schema_editor,
+        {'postgresql': PG_FORWARD, 'sqlite': SQLITE_FORWARD}
+    )
+
+
+def drop_search_schema(apps, schema_editor):
+    run_statements(
+        schema_editor,
+        {'postgresql': PG_BACKWARD, 'sqlite': SQLITE_BACKWARD}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_schema, drop_search_schema),
+    ]
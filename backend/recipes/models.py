@@ -1,16 +1,86 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import (
+    Case, Count, Exists, F, OuterRef, Prefetch, Subquery, Value, When, Window
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
 
 from backend.settings import AVATARS_URL
 from constants import (
-    DEFAULT_USER_AVATAR, LONG_MAX_LENGTH, MAX_LENGTH, MID_MAX_LENGTH,
-    MIN_COOKING_MINUTES, MIN_INGREDIENT_AMOUNT, SHORT_MAX_LENGTH,
-    TAG_MAX_LENGTH, USERNAME_PATTERN
+    DEFAULT_USER_AVATAR, LONG_MAX_LENGTH, MAX_BULK_MARKS, MAX_LENGTH,
+    MID_MAX_LENGTH, MIN_COOKING_MINUTES, MIN_INGREDIENT_AMOUNT,
+    SHORT_MAX_LENGTH, TAG_MAX_LENGTH, USERNAME_PATTERN
 )
+from recipes.marks import invalidate_marks
+from recipes.search import search
+
+
+def related_count(model, field):
+    """Подзапрос с числом строк model, ссылающихся на объект через field."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class CountersMixin:
+    """Сохранение модели без счетчиков, которые меняются UPDATE с F().
+
+    Иначе save() загруженного раньше объекта (аватар, пароль, правка
+    рецепта, админка) перезапишет счетчики старыми значениями и потеряет
+    изменения, сделанные за это время. Счетчики записываются только при
+    создании объекта или если их назвали в update_fields.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+
+class UserQuerySet(models.QuerySet):
+    """Выборки пользователей для API."""
+
+    def with_subscription(self, user):
+        """Отметка о подписке пользователя запроса на каждого из выборки."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_subscribed=Value(False, output_field=models.BooleanField())
+            )
+        return self.annotate(is_subscribed=Exists(
+            Subscribe.objects.filter(user=user, subscribed=OuterRef('pk'))
+        ))
+
+    def subscriptions(self, user):
+        """Авторы, на которых подписан пользователь."""
+        return self.filter(authors__user=user).with_subscription(user)
+
+    def actual_counts(self):
+        """Счетчики пользователя, посчитанные по связанным таблицам."""
+        return {
+            'recipes_count': related_count(Recipe, 'author'),
+            'followers_count': related_count(Subscribe, 'subscribed'),
+            'follows_count': related_count(Subscribe, 'user'),
+        }
 
 
-class User(AbstractUser):
+class FoodgramUserManager(UserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с выборками для API."""
+
+
+class User(CountersMixin, AbstractUser):
     """Кастомная модель пользователя."""
 
     email = models.CharField(
@@ -32,9 +102,23 @@ class User(AbstractUser):
         blank=True,
         default=DEFAULT_USER_AVATAR
     )
+    # Счетчики поддерживаются сигналами (recipes.signals), save() их не
+    # перезаписывает (CountersMixin).
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков', default=0, editable=False
+    )
+    follows_count = models.PositiveIntegerField(
+        verbose_name='Подписок', default=0, editable=False
+    )
+    counter_fields = ('recipes_count', 'followers_count', 'follows_count')
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', ]
     USERNAME_FIELD = 'email'
 
+    objects = FoodgramUserManager()
+
     class Meta:
         verbose_name = 'пользователь'
         verbose_name_plural = 'Пользователи'
@@ -132,7 +216,68 @@ class Ingredient(models.Model):
         return f'{self.name} ({self.measurement_unit})'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для API."""
+
+    def top_per_author(self, authors, limit):
+        """Первые limit свежих рецептов каждого из авторов одним запросом."""
+        recipes = self.filter(author__in=authors)
+        if connection.features.supports_over_clause:
+            ranked = recipes.annotate(row_num=Window(
+                RowNumber(),
+                partition_by=[F('author')],
+                order_by=[F('pub_date').desc(), F('pk').desc()]
+            )).order_by().values('pk', 'row_num')
+            sql, params = ranked.query.sql_with_params()
+            return recipes.filter(pk__in=RawSQL(
+                f'SELECT id FROM ({sql}) ranked WHERE row_num <= %s',
+                (*params, limit)
+            ))
+        # Старые версии SQLite не умеют оконные функции: берем срез
+        # коррелированным подзапросом.
+        return recipes.filter(pk__in=Subquery(
+            self.filter(author=OuterRef('author')).order_by(
+                '-pub_date', '-pk'
+            ).values('pk')[:limit]
+        ))
+
+    def search(self, text):
+        """Полнотекстовый поиск с оценкой совпадения search_rank."""
+        return search(self, text)
+
+    def actual_counts(self):
+        """Счетчики рецепта, посчитанные по связанным таблицам."""
+        return {
+            'favorites_count': related_count(Favorite, 'recipe'),
+            'shopping_carts_count': related_count(ShoppingCart, 'recipe'),
+        }
+
+    def feed(self, user):
+        """Рецепты авторов, на которых подписан пользователь: соединение
+        с подписками по (user, subscribed)."""
+        return self.filter(author__authors__user=user)
+
+    def for_read(self, user):
+        """Рецепты со всеми связями для показа за фиксированное число
+        запросов, независимо от количества рецептов на странице.
+
+        Отметки пользователя берутся из recipes.marks.MarkSets.
+        """
+        return self.prefetch_related(
+            # Автор подгружается отдельным запросом, чтобы нести отметку
+            # о подписке.
+            Prefetch('author', queryset=User.objects.with_subscription(user)),
+            'tags',
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+
+class Recipe(CountersMixin, models.Model):
     """Модель рецепта."""
 
     author = models.ForeignKey(
@@ -146,21 +291,48 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='recipe_images', verbose_name='Ссылка на картинку на сайте'
     )
+    # Уменьшенные копии картинки, заполняются фоном (recipes.images).
+    image_variants = models.JSONField(
+        verbose_name='Копии картинки', default=dict, editable=False
+    )
     text = models.TextField(verbose_name='Описание')
     tags = models.ManyToManyField(Tag, verbose_name='Список тегов')
     cooking_time = models.SmallIntegerField(
         verbose_name='Время (мин)',
         validators=[MinValueValidator(MIN_COOKING_MINUTES)]
     )
+    # Время по умолчанию, а не auto_now_add: bulk_create импорта и
+    # тестовых данных сохраняет заданную дату.
     pub_date = models.DateTimeField(
-        auto_now_add=True, verbose_name='Дата публикации'
+        default=timezone.now, editable=False, verbose_name='Дата публикации'
     )
+    # Счетчики поддерживаются сигналами (recipes.signals), save() их не
+    # перезаписывает (CountersMixin).
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном', default=0, editable=False
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах', default=0, editable=False
+    )
+    counter_fields = ('favorites_count', 'shopping_carts_count')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         default_related_name = 'recipes'
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            # Лента рецептов и страницы по курсору (-pub_date, -id).
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_idx'
+            ),
+            # Рецепты автора, подписки и лента подписок.
+            models.Index(
+                fields=['author', '-pub_date'], name='recipe_author_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -201,6 +373,87 @@ class IngredientInRecipe(models.Model):
                 f'{self.ingredient.measurement_unit}')
 
 
+class MarkQuerySet(models.QuerySet):
+    """Отметки пользователя на нескольких рецептах разом.
+
+    Запись - одна вставка или одно удаление на все рецепты. Сигналы при
+    этом не отправляются, поэтому счетчики рецептов (и список покупок для
+    корзины) обновляются здесь же, в той же транзакции.
+    """
+
+    def marked_recipes(self, user, recipe_ids):
+        """Существующие рецепты из recipe_ids с пометкой marked."""
+        return Recipe.objects.filter(pk__in=recipe_ids).annotate(
+            marked=Exists(self.filter(user=user, recipe=OuterRef('pk')))
+        ).order_by()
+
+    def lock_user(self, user):
+        # Запросы одного пользователя выполняются по очереди: иначе оба
+        # сочли бы рецепт неотмеченным и дважды изменили счетчики.
+        list(User.objects.select_for_update().filter(
+            pk=user.pk
+        ).order_by().values('pk'))
+
+    @transaction.atomic
+    def add_marks(self, user, recipe_ids):
+        """Отмечаем рецепты.
+
+        Возвращает отмеченные рецепты, id уже отмеченных и id
+        несуществующих.
+        """
+        self.lock_user(user)
+        recipes = {
+            recipe.pk: recipe
+            for recipe in self.marked_recipes(user, recipe_ids)
+        }
+        added = [recipe for recipe in recipes.values() if not recipe.marked]
+        self.bulk_create(
+            (self.model(user=user, recipe=recipe) for recipe in added),
+            ignore_conflicts=True
+        )
+        self.model.marks_changed(user, [recipe.pk for recipe in added], 1)
+        return (
+            added,
+            [pk for pk, recipe in recipes.items() if recipe.marked],
+            [pk for pk in recipe_ids if pk not in recipes]
+        )
+
+    def delete_marks(self, user, recipe_ids):
+        """Удаление одним DELETE на каждые MAX_BULK_MARKS рецептов.
+
+        QuerySet.delete() загрузил бы отметки и отправил сигналы, и
+        счетчики изменились бы второй раз; _raw_delete - его собственный
+        DELETE по условиям выборки, без загрузки и сигналов. Число
+        параметров запроса ограничено и при вызове не из API.
+        """
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), MAX_BULK_MARKS):
+            self.filter(
+                user=user,
+                recipe_id__in=recipe_ids[start:start + MAX_BULK_MARKS]
+            )._raw_delete(self.db)
+
+    @transaction.atomic
+    def remove_marks(self, user, recipe_ids):
+        """Снимаем отметки.
+
+        Возвращает id снятых, id неотмеченных и id несуществующих.
+        """
+        self.lock_user(user)
+        marked = dict(
+            self.marked_recipes(user, recipe_ids).values_list('pk', 'marked')
+        )
+        removed = [pk for pk, is_marked in marked.items() if is_marked]
+        if removed:
+            self.model.marks_changed(user, removed, -1)
+            self.delete_marks(user, removed)
+        return (
+            removed,
+            [pk for pk, is_marked in marked.items() if not is_marked],
+            [pk for pk in recipe_ids if pk not in marked]
+        )
+
+
 class Mark(models.Model):
     """Базовый класс для отметок (избранного и корзины)."""
 
@@ -215,6 +468,8 @@ class Mark(models.Model):
         verbose_name='Рецепт',
     )
 
+    objects = MarkQuerySet.as_manager()
+
     class Meta:
         abstract = True
         default_related_name = '%(class)ss'
@@ -229,10 +484,23 @@ class Mark(models.Model):
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
 
+    @classmethod
+    def marks_changed(cls, user, recipe_ids, sign):
+        """Обновляем счетчики рецептов после добавления (sign=1) или
+        перед удалением (sign=-1) отметок пачкой."""
+        recipes = Recipe.objects.filter(pk__in=recipe_ids)
+        if sign < 0:
+            recipes = recipes.filter(**{f'{cls.counter_field}__gte': 1})
+        recipes.update(**{cls.counter_field: F(cls.counter_field) + sign})
+        invalidate_marks(user.pk)
+
 
 class Favorite(Mark):
     """Добавление рецептов в избранное."""
 
+    # Счетчик отметок на рецепте.
+    counter_field = 'favorites_count'
+
     class Meta(Mark.Meta):
         verbose_name = 'избранное'
         verbose_name_plural = 'Избранное'
@@ -241,6 +509,118 @@ class Favorite(Mark):
 class ShoppingCart(Mark):
     """Добавление рецептов в список покупок."""
 
+    counter_field = 'shopping_carts_count'
+
+    @classmethod
+    def marks_changed(cls, user, recipe_ids, sign):
+        super().marks_changed(user, recipe_ids, sign)
+        CartProduct.objects.add_recipes(user.pk, recipe_ids, sign)
+
     class Meta(Mark.Meta):
         verbose_name = 'корзина'
         verbose_name_plural = 'Корзины'
+
+
+class CartProductQuerySet(models.QuerySet):
+    """Поддержка списка покупок пользователей по разницам."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляем к продуктам пользователей разницы количества.
+
+        deltas - словарь {id продукта: изменение количества}.
+        """
+        user_ids = list(user_ids)
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not user_ids or not deltas:
+            return
+        self.bulk_create(
+            (
+                CartProduct(user_id=user_id, ingredient_id=pk, amount=0)
+                for user_id in user_ids for pk, delta in deltas.items()
+                if delta > 0
+            ),
+            ignore_conflicts=True
+        )
+        products = self.filter(user_id__in=user_ids, ingredient__in=deltas)
+        products.update(amount=F('amount') + Case(
+            *(When(ingredient_id=pk, then=Value(delta))
+              for pk, delta in deltas.items()),
+            output_field=models.IntegerField()
+        ))
+        products.filter(amount__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        """Учитываем добавление (sign=1) или удаление (sign=-1) рецепта
+        из корзины пользователя."""
+        self.add_recipes(user_id, [recipe_id], sign)
+
+    def add_recipes(self, user_id, recipe_ids, sign=1):
+        """То же для нескольких рецептов сразу."""
+        if not recipe_ids:
+            return
+        self.apply_deltas([user_id], {
+            pk: sign * total
+            for pk, total in IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('ingredient_id').annotate(
+                total=models.Sum('amount')
+            ).values_list('ingredient_id', 'total').order_by()
+        })
+
+    def update_for_recipe(self, recipe, old_amounts):
+        """Пересчет корзин с рецептом после изменения его продуктов.
+
+        old_amounts - словарь {id продукта: количество} до изменения.
+        """
+        new_amounts = dict(
+            recipe.ingredients_in_recipe.values_list('ingredient_id', 'amount')
+        )
+        self.apply_deltas(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True
+            ),
+            {
+                pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+                for pk in {*new_amounts, *old_amounts}
+            }
+        )
+
+    def live_aggregate(self):
+        """Список покупок, посчитанный по корзинам заново."""
+        return IngredientInRecipe.objects.filter(
+            recipe__shoppingcarts__isnull=False
+        ).values(
+            'ingredient_id', user_id=F('recipe__shoppingcarts__user')
+        ).annotate(total=models.Sum('amount')).order_by()
+
+
+class CartProduct(models.Model):
+    """Продукты списка покупок пользователя, суммарно по корзине."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт'
+    )
+    amount = models.IntegerField(verbose_name='Мера')
+
+    objects = CartProductQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'продукт в списке покупок'
+        verbose_name_plural = 'Продукты в списках покупок'
+        default_related_name = 'cart_products'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_in_cart_products'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.ingredient}: {self.amount}'
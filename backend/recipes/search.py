@@ -0,0 +1,81 @@
+"""Полнотекстовый поиск рецептов.
+
+PostgreSQL: колонка search_vector (tsvector) с GIN-индексом, которую
+заполняет триггер базы по названию (вес A) и описанию (вес B) с русским
+стеммингом. SQLite: виртуальная таблица FTS5, которую поддерживают
+сигналы сохранения и удаления рецептов. Схема создается миграцией
+0005_recipe_search.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+RECIPE_TABLE = 'recipes_recipe'
+FTS_TABLE = 'recipes_recipe_fts'
+
+PG_QUERY = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+PG_MATCH = f'SELECT id FROM {RECIPE_TABLE} WHERE search_vector @@ {PG_QUERY}'
+PG_RANK = f'ts_rank({RECIPE_TABLE}.search_vector, {PG_QUERY})'
+
+# bm25 тем меньше, чем лучше совпадение; название весит вдвое больше.
+# Оценка считается в том же проходе по индексу, что и отбор: подзапрос
+# с MATCH на каждую строку повторял бы поиск для каждого рецепта.
+FTS_RANK = f'-bm25({FTS_TABLE}, 2.0, 1.0)'
+FTS_WHERE = (
+    f'{FTS_TABLE}.rowid = {RECIPE_TABLE}.id',
+    f'{FTS_TABLE} MATCH %s',
+)
+
+
+def fts_query(text):
+    """Запрос FTS5 из слов пользователя: все слова, по началу слова."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def search(recipes, text):
+    """Рецепты, подходящие под запрос, с оценкой search_rank."""
+    if connection.vendor == 'postgresql':
+        return recipes.filter(
+            pk__in=RawSQL(PG_MATCH, (text,))
+        ).annotate(
+            search_rank=RawSQL(PG_RANK, (text,), output_field=FloatField())
+        )
+    if connection.vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+            return recipes.annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            ).none()
+        return recipes.extra(
+            select={'search_rank': FTS_RANK},
+            tables=[FTS_TABLE],
+            where=FTS_WHERE,
+            params=(query,)
+        )
+    # Прочие базы: поиск подстроки без ранжирования.
+    return recipes.filter(
+        Q(name__icontains=text) | Q(text__icontains=text)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def index_recipes(recipes):
+    """Обновляем рецепты в индексе SQLite (в PostgreSQL это делает
+    триггер)."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                [(recipe.pk, recipe.name, recipe.text) for recipe in recipes]
+            )
+
+
+def unindex_recipe(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe_id,)
+            )
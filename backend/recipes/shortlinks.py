@@ -0,0 +1,91 @@
+"""Короткие ссылки на рецепты.
+
+Код - id рецепта в base62, первый символ всегда буква: код не спутать со
+старыми ссылками вида /s/<id>. Алфавиты перемешиваются солью
+SHORT_LINK_SALT, чтобы коды соседних рецептов не шли подряд.
+
+Существование рецептов по id запоминается в памяти процесса: известные
+id - на SHORT_LINK_HIT_TTL, отсутствующие - на SHORT_LINK_MISS_TTL.
+Сигналы рецептов поправляют запись своего процесса сразу, записи других
+процессов устаревают по времени.
+"""
+import random
+import string
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from constants import (
+    SHORT_LINK_CACHE_SIZE, SHORT_LINK_HIT_TTL, SHORT_LINK_MISS_TTL
+)
+from recipes.models import Recipe
+
+
+def shuffled(alphabet):
+    chars = list(alphabet)
+    if settings.SHORT_LINK_SALT:
+        random.Random(settings.SHORT_LINK_SALT).shuffle(chars)
+    return ''.join(chars)
+
+
+# Наибольший id BigAutoField: большие числа база не примет.
+MAX_RECIPE_ID = 2 ** 63 - 1
+LETTERS = shuffled(string.ascii_letters)
+ALPHABET = shuffled(string.digits + string.ascii_letters)
+
+
+def encode(recipe_id):
+    """Короткий код рецепта."""
+    recipe_id, first = divmod(recipe_id, len(LETTERS))
+    code = LETTERS[first]
+    while recipe_id:
+        recipe_id, digit = divmod(recipe_id, len(ALPHABET))
+        code += ALPHABET[digit]
+    return code
+
+
+def decode(code):
+    """id рецепта по коду; None, если код не наш."""
+    if not code or code[0] not in LETTERS:
+        return None
+    recipe_id, scale = LETTERS.index(code[0]), len(LETTERS)
+    for char in code[1:]:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            return None
+        recipe_id += digit * scale
+        scale *= len(ALPHABET)
+    # У одного id один код: с лишними "нулями" в конце - чужой.
+    return recipe_id if encode(recipe_id) == code else None
+
+
+class RecipeIdCache:
+    """Есть ли рецепт с таким id: ответы базы с временем жизни."""
+
+    def __init__(self, size=SHORT_LINK_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def remember(self, recipe_id, exists):
+        ttl = SHORT_LINK_HIT_TTL if exists else SHORT_LINK_MISS_TTL
+        with self.lock:
+            self.entries[recipe_id] = (exists, time.monotonic() + ttl)
+            self.entries.move_to_end(recipe_id)
+            # Перебор несуществующих кодов не раздувает память процесса.
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def exists(self, recipe_id):
+        with self.lock:
+            entry = self.entries.get(recipe_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        exists = Recipe.objects.filter(id=recipe_id).exists()
+        self.remember(recipe_id, exists)
+        return exists
+
+
+recipe_ids = RecipeIdCache()
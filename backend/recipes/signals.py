@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.models import (
+    CartProduct, Favorite, Recipe, ShoppingCart, Subscribe, User
+)
+from recipes.images import delete_variants, schedule_variants
+from recipes.marks import invalidate_marks
+from recipes.search import index_recipes, unindex_recipe
+from recipes.shortlinks import recipe_ids
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарное изменение счетчика одним UPDATE."""
+    objects = model.objects.filter(pk=pk)
+    if delta < 0:
+        # Разошедшийся счетчик не уводим ниже нуля, его поправит
+        # reconcile_counters.
+        objects = objects.filter(**{f'{field}__gte': -delta})
+    objects.update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=ShoppingCart)
+def recipe_added_to_cart(sender, instance, created, **kwargs):
+    if created:
+        CartProduct.objects.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def recipe_removed_from_cart(sender, instance, **kwargs):
+    # До удаления: при каскаде от рецепта его продукты еще на месте.
+    CartProduct.objects.add_recipe(
+        instance.user_id, instance.recipe_id, sign=-1
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def mark_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, sender.counter_field, 1)
+        invalidate_marks(instance.user_id)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def mark_removed(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, sender.counter_field, -1)
+    invalidate_marks(instance.user_id)
+
+
+@receiver(post_save, sender=Subscribe)
+def subscription_added(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.user_id, 'follows_count', 1)
+        change_counter(User, instance.subscribed_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscription_removed(sender, instance, **kwargs):
+    change_counter(User, instance.user_id, 'follows_count', -1)
+    change_counter(User, instance.subscribed_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+    index_recipes([instance])
+    transaction.on_commit(lambda: schedule_variants(instance))
+    if created:
+        transaction.on_commit(lambda: recipe_ids.remember(instance.pk, True))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+    unindex_recipe(instance.pk)
+    # К фиксации транзакции pk экземпляра будет обнулен.
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: recipe_ids.remember(recipe_id, False))
+    transaction.on_commit(lambda: delete_variants(instance.image_variants))
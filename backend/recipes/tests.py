@@ -0,0 +1,353 @@
+import argparse
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from constants import (
+    SHORT_LINK_HIT_TTL, SHORT_LINK_MAX_AGE, SHORT_LINK_MISS_TTL
+)
+from recipes.management.commands._benchmark import (
+    latency_stats, positive_int
+)
+from recipes.management.commands.import_recipes import (
+    Command as ImportCommand
+)
+from recipes.models import (
+    Favorite, Ingredient, IngredientInRecipe, Recipe, Subscribe, Tag, User
+)
+from recipes.shortlinks import (
+    ALPHABET, LETTERS, MAX_RECIPE_ID, RecipeIdCache, decode, encode,
+    recipe_ids
+)
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов списков админки не зависит от числа строк."""
+
+    # Модель: запросов на страницу списка, вместе с сессией и
+    # пользователем.
+    changelists = {'user': 6, 'recipe': 9, 'tag': 5, 'ingredient': 6}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email='admin@example.com', username='admin', first_name='Имя',
+            last_name='Фамилия', password='password'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        """Еще count пользователей, тегов, продуктов и рецептов."""
+        start = User.objects.count()
+        for number in range(start, start + count):
+            user = User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия'
+            )
+            Subscribe.objects.create(user=user, subscribed=self.admin)
+            tag = Tag.objects.create(name=f'Тег {number}', slug=f't{number}')
+            ingredient = Ingredient.objects.create(
+                name=f'продукт {number}', measurement_unit='г'
+            )
+            recipe = Recipe.objects.create(
+                author=user, name=f'Рецепт {number}', text='Описание',
+                image=f'recipe_images/{number}.png', cooking_time=10
+            )
+            recipe.tags.set([tag])
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+
+    def test_changelists(self):
+        for rows in (5, 40):
+            self.add_rows(rows - Tag.objects.count())
+            for model, queries in self.changelists.items():
+                with self.subTest(model=model, rows=rows):
+                    with self.assertNumQueries(queries):
+                        response = self.client.get(
+                            reverse(f'admin:recipes_{model}_changelist')
+                        )
+                    # Все строки на одной странице, плюс администратор.
+                    self.assertEqual(
+                        len(response.context['cl'].result_list),
+                        rows + (model == 'user')
+                    )
+
+
+class CountersSaveTest(TestCase):
+    """save() загруженного раньше объекта не теряет изменения счетчиков."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = [
+            User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия'
+            ) for number in range(2)
+        ]
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            image='recipe_images/recipe.png', cooking_time=10
+        )
+
+    def test_user_save(self):
+        author = User.objects.get(pk=self.author.pk)
+        Subscribe.objects.create(user=self.reader, subscribed=self.author)
+        author.avatar = 'avatars/new.png'
+        author.save()
+        author.refresh_from_db()
+        self.assertEqual(author.avatar, 'avatars/new.png')
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(author.recipes_count, 1)
+
+    def test_recipe_save(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_named_counter_is_saved(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.favorites_count = 5
+        recipe.save(update_fields=['favorites_count'])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 5)
+
+
+class ShortLinksTest(TestCase):
+    """Коды коротких ссылок, редиректы и кеш id рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            image='recipe_images/recipe.png', cooking_time=10
+        )
+
+    def setUp(self):
+        recipe_ids.entries.clear()
+
+    def test_round_trip(self):
+        for recipe_id in (
+            0, 1, len(LETTERS) - 1, len(LETTERS), len(LETTERS) * 62,
+            2 ** 40, MAX_RECIPE_ID
+        ):
+            with self.subTest(recipe_id=recipe_id):
+                code = encode(recipe_id)
+                self.assertIn(code[0], LETTERS)
+                self.assertEqual(decode(code), recipe_id)
+
+    def test_invalid_codes(self):
+        code = encode(12345)
+        for invalid in (
+            '', '7' + code[1:], code + '-', code + ALPHABET[0], 'ж'
+        ):
+            with self.subTest(code=invalid):
+                self.assertIsNone(decode(invalid))
+
+    def test_redirect(self):
+        for url in (
+            reverse('recipes:short_link', args=[encode(self.recipe.id)]),
+            reverse('recipes:legacy_link', args=[self.recipe.id]),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(
+                    response['Location'], f'/recipes/{self.recipe.id}/'
+                )
+                self.assertIn(
+                    f'max-age={SHORT_LINK_MAX_AGE}', response['Cache-Control']
+                )
+
+    def test_not_found(self):
+        for code in (
+            encode(self.recipe.id + 1), '7' * 5, 'zzzzzz',
+            encode(MAX_RECIPE_ID) + ALPHABET[1] * 3,
+            str(self.recipe.id + 1), str(MAX_RECIPE_ID + 1),
+        ):
+            with self.subTest(code=code):
+                response = self.client.get(f'/s/{code}')
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(
+                    response.content.decode(), 'Рецепт не найден'
+                )
+
+    def test_cache_ttl(self):
+        cache = RecipeIdCache()
+        missing = self.recipe.id + 1
+        with mock.patch('recipes.shortlinks.time.monotonic') as monotonic:
+            monotonic.return_value = 1000
+            with self.assertNumQueries(2):
+                self.assertTrue(cache.exists(self.recipe.id))
+                self.assertFalse(cache.exists(missing))
+                self.assertTrue(cache.exists(self.recipe.id))
+                self.assertFalse(cache.exists(missing))
+            # Отсутствующий id перепроверяется раньше известного.
+            monotonic.return_value += SHORT_LINK_MISS_TTL + 1
+            with self.assertNumQueries(1):
+                self.assertTrue(cache.exists(self.recipe.id))
+                self.assertFalse(cache.exists(missing))
+            monotonic.return_value += SHORT_LINK_HIT_TTL
+            with self.assertNumQueries(1):
+                self.assertTrue(cache.exists(self.recipe.id))
+
+    def test_cache_size(self):
+        cache = RecipeIdCache(size=2)
+        for recipe_id in range(3):
+            cache.remember(recipe_id, False)
+        self.assertEqual(list(cache.entries), [1, 2])
+
+
+class ExportImportTest(TestCase):
+    """Выгрузка рецептов и загрузка обратно, с продолжением загрузки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Имя', last_name='Фамилия'
+        )
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(2)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'продукт {number}', measurement_unit='г'
+            ) for number in range(3)
+        ]
+        for number in range(5):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}', text='Описание',
+                image=f'recipe_images/{number}.png', cooking_time=number + 1,
+                # Дата в прошлом: загрузка должна ее сохранить.
+                pub_date=timezone.now() - timedelta(
+                    days=number + 1
+                )
+            )
+            recipe.tags.set(tags[:number % 2 + 1])
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                ) for ingredient in ingredients[:number % 3 + 1]
+            )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'recipes.ndjson')
+
+    def export(self):
+        call_command(
+            'export_recipes', self.path, batch_size=2, stdout=StringIO()
+        )
+        with open(self.path, encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        for row in rows:
+            del row['id']
+        return rows
+
+    def import_recipes(self, **options):
+        call_command(
+            'import_recipes', self.path, batch_size=2, stdout=StringIO(),
+            **options
+        )
+
+    def assert_round_trip(self, exported):
+        self.assertEqual(self.export(), exported)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, len(exported))
+        self.assertFalse(os.path.exists(f'{self.path}.progress'))
+
+    def test_round_trip(self):
+        exported = self.export()
+        Recipe.objects.all().delete()
+        self.import_recipes()
+        self.assert_round_trip(exported)
+
+    def test_resume(self):
+        exported = self.export()
+        Recipe.objects.all().delete()
+        save_batch = ImportCommand.save_batch
+        calls = []
+
+        def interrupted(command, batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise RuntimeError('Загрузка прервана.')
+            return save_batch(command, batch)
+
+        with mock.patch.object(ImportCommand, 'save_batch', interrupted):
+            with self.assertRaises(RuntimeError):
+                self.import_recipes()
+        self.assertEqual(Recipe.objects.count(), 2)
+        with open(f'{self.path}.progress', encoding='utf-8') as file:
+            self.assertEqual(file.read(), '2')
+        self.import_recipes(resume=True)
+        self.assert_round_trip(exported)
+
+
+class BenchmarkHelpersTest(SimpleTestCase):
+    """Общие функции команд замеров."""
+
+    def test_latency_stats(self):
+        for timings in ([5.0], [5.0, 7.0], [1.0, 2.0, 3.0, 4.0]):
+            with self.subTest(timings=timings):
+                stats = latency_stats(timings, elapsed=1)
+                self.assertEqual(stats['requests'], len(timings))
+                self.assertEqual(stats['p50_ms'], (
+                    timings[0] + timings[-1]
+                ) / 2)
+                self.assertLessEqual(stats['p99_ms'], max(timings))
+
+    def test_positive_int(self):
+        self.assertEqual(positive_int('1'), 1)
+        for value in ('0', '-3'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                positive_int(value)
+
+
+class SeedDataTest(TestCase):
+    """seed_data с одним зерном создает одни и те же данные."""
+
+    def seed(self, prefix):
+        call_command(
+            'seed_data', scale=0.002, seed=7, prefix=prefix,
+            stdout=StringIO()
+        )
+        return list(Recipe.objects.filter(
+            author__username__startswith=prefix
+        ).order_by('pk').values_list('name', 'cooking_time', 'pub_date'))
+
+    def test_same_data_for_same_seed(self):
+        # Справочники с запасом на выборки строк рецепта.
+        for number in range(3):
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'продукт {number}', measurement_unit='г')
+            for number in range(12)
+        )
+        with tempfile.TemporaryDirectory() as media:
+            with override_settings(MEDIA_ROOT=media):
+                first = self.seed('first')
+                second = self.seed('second')
+        self.assertEqual(len(first), 20)
+        self.assertEqual(first, second)
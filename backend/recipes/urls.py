@@ -1,9 +1,10 @@
 from django.urls import path
 
-from recipes.views import short_link_redirect
+from recipes.views import legacy_link_redirect, short_link_redirect
 
 app_name = 'recipes'
 
 urlpatterns = [
-    path('s/<int:recipe_id>', short_link_redirect, name='short_link'),
+    path('s/<int:recipe_id>', legacy_link_redirect, name='legacy_link'),
+    path('s/<str:code>', short_link_redirect, name='short_link'),
 ]
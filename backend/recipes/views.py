@@ -1,11 +1,32 @@
-from django.http import Http404
-from django.shortcuts import redirect
+from django.http import HttpResponseNotFound, HttpResponseRedirect
+from django.utils.cache import patch_cache_control
 
-from recipes.models import Recipe
+from constants import SHORT_LINK_MAX_AGE, SHORT_LINK_MISS_TTL
+from recipes.shortlinks import MAX_RECIPE_ID, decode, recipe_ids
 
 
-def short_link_redirect(request, recipe_id):
+def recipe_redirect(recipe_id):
+    if (
+        recipe_id is None or recipe_id > MAX_RECIPE_ID
+        or not recipe_ids.exists(recipe_id)
+    ):
+        # Без id в ответе: для чужого кода он ничего не значит.
+        response = HttpResponseNotFound('Рецепт не найден')
+        # Рецепт с таким id может вскоре появиться.
+        patch_cache_control(response, public=True, max_age=SHORT_LINK_MISS_TTL)
+        return response
+    # Временный редирект с коротким сроком хранения: рецепт могут
+    # удалить, и браузеры и прокси не должны долго вести на него.
+    response = HttpResponseRedirect(f'/recipes/{recipe_id}/')
+    patch_cache_control(response, public=True, max_age=SHORT_LINK_MAX_AGE)
+    return response
+
+
+def short_link_redirect(request, code):
     """Редирект коротких ссылок на рецепт."""
-    if not Recipe.objects.filter(id=recipe_id).exists():
-        raise Http404(f'Рецепт {recipe_id} не найден')
-    return redirect(f'/recipes/{recipe_id}/')
+    return recipe_redirect(decode(code))
+
+
+def legacy_link_redirect(request, recipe_id):
+    """Редирект старых коротких ссылок вида /s/<id>."""
+    return recipe_redirect(recipe_id)